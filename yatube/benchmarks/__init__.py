@@ -0,0 +1,11 @@
+"""Бенчмарки yatube.
+
+Запускаются из папки yatube как модули: python -m benchmarks.<имя> --help.
+"""
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
@@ -0,0 +1,161 @@
+"""Медленные клиенты при одинаковом числе рабочих потоков: WSGI против ASGI.
+
+WSGI: поток сервера занят запросом целиком, вместе с приёмом запроса
+и отдачей ответа медленному клиенту (как у gunicorn с потоками).
+ASGI: приём и отдача идут в цикле событий, поток пула (core/asgi.py)
+занят только работой Django. Медленный клиент - задержка --client-delay
+секунд, поровну на отправку запроса и чтение ответа.
+
+    python -m benchmarks.asgi_concurrency --workers 4 --clients 32
+"""
+import argparse
+import asyncio
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from . import setup_django
+from .measure import summary
+
+
+def scopes(data):
+    """Запросы к лентам по кругу: главная, группа, профиль, пост."""
+    from django.urls import reverse
+
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:group_list', args=[data['group'].slug]),
+        reverse('posts:profile', args=[data['author'].username]),
+        reverse('posts:post_detail', args=[data['post'].pk]),
+    ]
+    return itertools.cycle([
+        {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'localhost')],
+        }
+        for path in paths
+    ])
+
+
+def run_wsgi(adapter, requests, args):
+    """Пул из --workers потоков держит каждый запрос от начала до конца."""
+    from core.asgi import build_environ
+
+    half = args.client_delay / 2
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    lock = threading.Lock()
+    latencies = []
+
+    def serve(scope):
+        time.sleep(half)
+        status, _, _ = adapter.run(build_environ(scope, BytesIO()))
+        time.sleep(half)
+        return status
+
+    def client():
+        while True:
+            with lock:
+                scope = next(requests, None)
+            if scope is None:
+                return
+            started = time.perf_counter()
+            if pool.submit(serve, scope).result() != 200:
+                raise RuntimeError(scope['path'])
+            latencies.append(time.perf_counter() - started)
+
+    clients = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return latencies, elapsed
+
+
+def run_asgi(adapter, requests, args):
+    """Клиенты - сопрограммы, медленный ввод-вывод ждёт в цикле событий."""
+    half = args.client_delay / 2
+    latencies = []
+
+    async def request(scope):
+        async def receive():
+            await asyncio.sleep(half)
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                if message['status'] != 200:
+                    raise RuntimeError(scope['path'])
+            else:
+                await asyncio.sleep(half)
+
+        await adapter(scope, receive, send)
+
+    async def client():
+        for scope in requests:
+            started = time.perf_counter()
+            await request(scope)
+            latencies.append(time.perf_counter() - started)
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(args.clients)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument(
+        '--client-delay', type=float, default=0.1,
+        help='Секунды на отправку запроса и чтение ответа клиентом.',
+    )
+    parser.add_argument('--posts', type=int, default=2000)
+    args = parser.parse_args()
+    setup_django()
+    from django.core.wsgi import get_wsgi_application
+    from django.test import override_settings
+
+    from core.asgi import WSGIToASGI, build_environ
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(DEBUG=False, MEDIA_ROOT=media_root).enable()
+    destroy = create_database()
+    try:
+        data = seed(200, 20, args.posts, args.posts * 2, images=0)
+        adapter = WSGIToASGI(get_wsgi_application(), threads=args.workers)
+        # Прогрев кэша, чтобы первый режим не платил за промахи.
+        for scope in itertools.islice(scopes(data), 4):
+            adapter.run(build_environ(scope, BytesIO()))
+        print(f'Потоков: {args.workers}, клиентов: {args.clients}, '
+              f'задержка клиента: {args.client_delay * 1000:.0f} мс')
+        print(f'{"режим":<6} {"запросов/с":>10} {"p50, мс":>8} '
+              f'{"p95, мс":>8}')
+        for name, run in (('wsgi', run_wsgi), ('asgi', run_asgi)):
+            requests = itertools.islice(scopes(data), args.requests)
+            latencies, elapsed = run(adapter, requests, args)
+            result = summary(latencies)
+            print(f'{name:<6} {len(latencies) / elapsed:10.1f} '
+                  f'{result["p50"]:8.1f} {result["p95"]:8.1f}')
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
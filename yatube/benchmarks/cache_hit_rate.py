@@ -0,0 +1,105 @@
+"""Доля попаданий в кэш лент при нескольких рабочих процессах.
+
+Каждый процесс, как воркер gunicorn, обслуживает свою часть запросов
+к страницам ленты (популярность страниц убывает по закону Ципфа):
+при промахе страница "рендерится" и кладётся в кэш. С locmem у каждого
+процесса свой холодный кэш, общий кэш прогревается один раз на всех.
+
+    python -m benchmarks.cache_hit_rate --workers 16 --requests 20000
+"""
+import argparse
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+
+from django.utils.module_loading import import_string
+
+from . import setup_django
+
+try:
+    import pymemcache
+except ImportError:
+    pymemcache = None
+
+# Размер закэшированного фрагмента ленты, байт.
+FRAGMENT_SIZE: int = 20 * 1024
+
+
+def create_cache(config):
+    return import_string(config['BACKEND'])(config.get('LOCATION', ''), config)
+
+
+def worker(config, requests, pages, seed):
+    cache = create_cache(config)
+    rng = random.Random(seed)
+    weights = [1 / page for page in range(1, pages + 1)]
+    keys = rng.choices(range(1, pages + 1), weights, k=requests)
+    fragment = b'x' * FRAGMENT_SIZE
+    hits = 0
+    started = time.perf_counter()
+    for page in keys:
+        key = f'index_feed:{page}'
+        if cache.get(key) is None:
+            cache.set(key, fragment, 300)
+        else:
+            hits += 1
+    return hits, time.perf_counter() - started
+
+
+def run(name, config, workers, requests, pages):
+    per_worker = requests // workers
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(workers) as pool:
+        results = pool.starmap(
+            worker,
+            [(config, per_worker, pages, seed) for seed in range(workers)],
+        )
+    hits = sum(hits for hits, _ in results)
+    elapsed = max(seconds for _, seconds in results)
+    total = per_worker * workers
+    print(
+        f'{name:<10} {workers:>7} {hits / total:>9.1%} '
+        f'{total / elapsed:>12.0f}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--pages', type=int, default=500)
+    args = parser.parse_args()
+    setup_django()
+    from core.testing.memcached import MemcachedServer
+
+    file_location = tempfile.mkdtemp(prefix='yatube_bench_cache_')
+    backends = {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': file_location,
+        },
+    }
+    server = None
+    if pymemcache is not None:
+        server = MemcachedServer().start()
+        backends['memcached'] = {
+            'BACKEND': 'core.cache.PyMemcacheCache',
+            'LOCATION': server.location,
+        }
+    print(f'{"backend":<10} {"workers":>7} {"hit rate":>9} {"requests/s":>12}')
+    try:
+        for name, config in backends.items():
+            run(name, config, args.workers, args.requests, args.pages)
+    finally:
+        shutil.rmtree(file_location, ignore_errors=True)
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Синтетический набор данных для бенчмарков.
+
+Пользователи и группы создаются через mixer, тексты - через Faker.
+Популярность авторов распределена по степенному закону: немногие
+авторы пишут большую часть постов и собирают большую часть подписчиков.
+"""
+import os
+import random
+import tempfile
+from io import BytesIO
+
+# Показатель степенного закона популярности авторов.
+ZIPF_EXPONENT: float = 1.1
+BATCH_SIZE: int = 1000
+
+
+def create_database():
+    """Создаёт и мигрирует одноразовую базу SQLite во временном файле.
+
+    Возвращает функцию, которая удаляет базу.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    handle, path = tempfile.mkstemp(prefix='yatube_bench_', suffix='.db')
+    os.close(handle)
+    connection.settings_dict['TEST']['NAME'] = path
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True
+    )
+
+    def destroy():
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return destroy
+
+
+def zipf_weights(count):
+    return [1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)]
+
+
+def _jpeg(seed, size=(1200, 800)):
+    from PIL import Image
+
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+    tint = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    Image.blend(gradient, tint, 0.5).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _bulk(model, objects):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def seed(users=200, groups=20, posts=2000, comments=5000, images=0.3,
+         seed=0):
+    """Наполняет базу и возвращает словарь с примерами объектов.
+
+    images - доля постов с картинкой (картинки общие для нескольких
+    постов, чтобы не раздувать MEDIA_ROOT).
+    """
+    from django.contrib.auth import get_user_model
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.db import transaction
+    from faker import Faker
+    from mixer.backend.django import mixer
+
+    from posts import caching, search, timeline
+    from posts.counters import rebuild_counters
+    from posts.models import Comment, Follow, Group, Post
+
+    User = get_user_model()
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    with transaction.atomic():
+        authors = mixer.cycle(users).blend(
+            User, username=mixer.sequence('user{0}')
+        )
+        all_groups = mixer.cycle(groups).blend(
+            Group, slug=mixer.sequence('group{0}')
+        )
+    user_ids = [user.pk for user in authors]
+    weights = zipf_weights(users)
+    image_names = [
+        default_storage.save(f'posts/bench_{number}.jpg',
+                             ContentFile(_jpeg(number)))
+        for number in range(5)
+    ] if images else []
+
+    def make_posts():
+        for _ in range(posts):
+            yield Post(
+                author_id=rng.choices(user_ids, weights)[0],
+                group=rng.choice(all_groups) if rng.random() < 0.7 else None,
+                text=fake.paragraph(nb_sentences=rng.randint(1, 8)),
+                image=(rng.choice(image_names)
+                       if image_names and rng.random() < images else ''),
+            )
+
+    def make_follows():
+        for user_id in user_ids:
+            # Число подписок тоже распределено степенно.
+            count = min(users - 1, int(rng.paretovariate(1.2)) * 3)
+            followed = set(rng.choices(user_ids, weights, k=count))
+            followed.discard(user_id)
+            for author_id in followed:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    with transaction.atomic():
+        _bulk(Post, make_posts())
+        _bulk(Follow, make_follows())
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        post_weights = zipf_weights(len(post_ids))
+        _bulk(Comment, (
+            Comment(
+                post_id=rng.choices(post_ids, post_weights)[0],
+                author_id=rng.choice(user_ids),
+                text=fake.sentence()[:200],
+            )
+            for _ in range(comments)
+        ))
+        rebuild_counters()
+        timeline.rebuild()
+        search.rebuild()
+    caching.bump(caching.ALL_POSTS)
+    # Самые популярные объекты - для адресов страниц.
+    popular_author = authors[0]
+    return {
+        'author': popular_author,
+        'reader': authors[-1],
+        'group': all_groups[0],
+        'post': Post.objects.filter(author=popular_author).order_by(
+            '-comment_count'
+        ).first(),
+        'query': fake.word(),
+    }
@@ -0,0 +1,177 @@
+"""Публикация постов во время чтения лент: настройки SQLite по умолчанию
+против профиля production (WAL, synchronous=normal, busy_timeout,
+постоянные соединения).
+
+Читатели в нескольких процессах открывают главную, группу, профиль
+и ленту подписок, писатель публикует посты через форму. Процессы, а не
+потоки - как у воркеров gunicorn, без соперничества за GIL; запуск
+через fork, поэтому только Linux и macOS. Кэш отключён, чтобы каждое
+чтение шло в базу.
+
+    python -m benchmarks.db_concurrency --readers 4 --seconds 5
+"""
+import argparse
+import itertools
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from . import setup_django
+from .measure import summary
+
+
+def worker(kind, make_request, data, stop, results):
+    """Повторяет запросы до stop в дочернем процессе."""
+    from django.db import OperationalError, connections
+
+    request = make_request(data)
+    latencies, errors = [], []
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            request()
+        except OperationalError as error:
+            errors.append(str(error))
+            continue
+        latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    results.put((kind, latencies, errors))
+
+
+def reader(data):
+    """Запросы читателя: лента, группа или профиль и лента подписок."""
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    client.force_login(data['reader'])
+    urls = itertools.cycle([
+        reverse('posts:index'),
+        reverse('posts:group_list', args=[data['group'].slug]),
+        reverse('posts:profile', args=[data['author'].username]),
+    ])
+    follow = reverse('posts:follow_index')
+
+    def request():
+        for url in (next(urls), follow):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: {response.status_code}')
+    return request
+
+
+def writer(data):
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    client.force_login(data['author'])
+    url = reverse('posts:post_create')
+    numbers = itertools.count()
+
+    def request():
+        response = client.post(url, {
+            'text': f'Пост под нагрузкой {next(numbers)}',
+            'group': data['group'].pk,
+        })
+        if response.status_code != 302:
+            raise RuntimeError(f'{url}: {response.status_code}')
+    return request
+
+
+def run(profile, data, args):
+    from django.conf import settings
+    from django.db import connection, connections
+    from django.test import override_settings
+
+    pragmas = (settings.SQLITE_PRODUCTION_PRAGMAS if profile == 'production'
+               else {'journal_mode': 'delete'})
+    connections.databases['default']['CONN_MAX_AGE'] = (
+        60 if profile == 'production' else 0
+    )
+    with override_settings(SQLITE_PRAGMAS=pragmas,
+                           DB_HEALTH_CHECKS=profile == 'production'):
+        # Режим журнала меняется, когда к файлу нет других соединений.
+        connection.close()
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal, = cursor.fetchone()
+        # Дочерние процессы не должны делить соединение родителя.
+        connection.close()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        results = context.Queue()
+        workers = [('read', reader)] * args.readers + [('write', writer)]
+        processes = [
+            context.Process(
+                target=worker, args=(kind, make, data, stop, results)
+            )
+            for kind, make in workers
+        ]
+        for process in processes:
+            process.start()
+        time.sleep(args.seconds)
+        stop.set()
+        latencies = {'read': [], 'write': []}
+        errors = {'read': [], 'write': []}
+        for _ in processes:
+            kind, values, failures = results.get()
+            latencies[kind] += values
+            errors[kind] += failures
+        for process in processes:
+            process.join()
+    reads, writes = summary(latencies['read']), summary(latencies['write'])
+    print(
+        f'{profile:<11} {journal:<7} '
+        f'{len(latencies["read"]) / args.seconds:8.1f} '
+        f'{reads["p95"]:8.1f} {len(errors["read"]):7} '
+        f'{len(latencies["write"]) / args.seconds:8.1f} '
+        f'{writes["p50"]:8.1f} {writes["p95"]:8.1f} '
+        f'{len(errors["write"]):7}'
+    )
+    for error in sorted(set(errors['read'] + errors['write'])):
+        print(f'    {error}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument(
+        '--profiles', nargs='+', choices=('default', 'production'),
+        default=('default', 'production'),
+    )
+    args = parser.parse_args()
+    setup_django()
+    from django.test import override_settings
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(
+        DEBUG=False,
+        MEDIA_ROOT=media_root,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }},
+        POST_THUMBNAIL_WORKERS=0,
+    ).enable()
+    destroy = create_database()
+    try:
+        data = seed(args.users, 20, args.posts, args.posts * 2, images=0)
+        print(f'{"профиль":<11} {"журнал":<7} {"чтений/с":>8} '
+              f'{"p95, мс":>8} {"ошибок":>7} {"постов/с":>8} '
+              f'{"p50, мс":>8} {"p95, мс":>8} {"ошибок":>7}')
+        for profile in args.profiles:
+            run(profile, data, args)
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Объём картинок на странице ленты до и после srcset/WebP/AVIF.
+
+До: каждому клиенту отдаётся JPEG 960x339. После: браузер выбирает
+из <picture> первый поддерживаемый формат и наименьшую ширину,
+покрывающую ширину слота с учётом плотности пикселей экрана.
+
+    python -m benchmarks.image_bytes --posts 10
+"""
+import argparse
+import random
+from io import BytesIO
+
+from . import setup_django
+
+# (название, ширина слота в CSS-пикселях, плотность, форматы браузера)
+CLIENTS = (
+    ('desktop', 960, 1, ('image/avif', 'image/webp')),
+    ('mobile 2x', 360, 2, ('image/avif', 'image/webp')),
+    ('mobile 1x', 360, 1, ('image/webp',)),
+    ('legacy', 960, 1, ()),
+)
+
+
+def synthetic_photo(seed, size=(2400, 1600)):
+    """Градиент с шумом разного масштаба: детали есть на любой ширине,
+    поэтому картинка сжимается примерно как фотография."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+    tint = Image.new(
+        'RGB', size, tuple(rng.randrange(256) for _ in range(3))
+    )
+    image = Image.blend(gradient, tint, 0.5)
+    for scale in (64, 16, 4, 1):
+        noise = Image.effect_noise(
+            (size[0] // scale, size[1] // scale), 60
+        ).resize(size, Image.BICUBIC).convert('RGB')
+        image = Image.blend(image, noise, 0.2)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=92)
+    buffer.seek(0)
+    return buffer
+
+
+def choose(variants, thumbnail, formats, needed_width):
+    for mime in formats:
+        sizes = variants.get(mime)
+        if not sizes:
+            continue
+        fitting = [size for size in sizes if size[0] >= needed_width]
+        width, _, content = min(fitting) if fitting else max(sizes)
+        return mime, width, len(content)
+    return 'image/jpeg', 960, len(thumbnail)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=10)
+    args = parser.parse_args()
+    setup_django()
+    from posts.thumbnails import available_formats, render_variants
+
+    rendered = [
+        render_variants(synthetic_photo(seed)) for seed in range(args.posts)
+    ]
+    print('Форматы:', ', '.join(fmt[0] for fmt in available_formats()))
+    before = sum(len(thumbnail) for thumbnail, _ in rendered)
+    print(f'{"client":<10} {"format":<11} {"width":>5} '
+          f'{"before, KB":>11} {"after, KB":>10} {"saved":>6}')
+    for name, slot, density, formats in CLIENTS:
+        picks = [
+            choose(variants, thumbnail, formats, slot * density)
+            for thumbnail, variants in rendered
+        ]
+        after = sum(size for _, _, size in picks)
+        mime, width, _ = picks[0]
+        print(
+            f'{name:<10} {mime:<11} {width:>5} {before / 1024:>11.0f} '
+            f'{after / 1024:>10.0f} {1 - after / before:>6.0%}'
+        )
+
+
+if __name__ == '__main__':
+    main()
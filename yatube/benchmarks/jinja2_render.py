@@ -0,0 +1,128 @@
+"""Отрисовка лент шаблонами Django и Jinja2 бок о бок.
+
+Django - как в production: cached.Loader с подстановкой статьи ленты
+(benchmarks.template_render, режим inlined). Jinja2 - шаблоны из папки
+jinja2 через core.jinja2. Перед замером проверяется, что оба движка
+выдают одинаковый HTML с точностью до пробелов.
+
+    python -m benchmarks.jinja2_render --posts 10 --repeat 300
+"""
+import argparse
+import re
+import shutil
+import tempfile
+import time
+
+from . import setup_django
+from .measure import summary
+from .template_render import backend
+
+TEMPLATES = (
+    'posts/index.html', 'posts/group_list.html',
+    'posts/profile.html', 'posts/follow.html',
+)
+
+
+def jinja2_backend():
+    from django.conf import settings
+
+    from core.jinja2 import Jinja2
+
+    return Jinja2({
+        'NAME': 'jinja2',
+        'DIRS': [settings.BASE_DIR + '/jinja2'],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+            'context_processors': (
+                settings.TEMPLATES[0]['OPTIONS']['context_processors']
+            ),
+        },
+    })
+
+
+def normalize(html):
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+    return re.sub(r'\s+', ' ', html.replace('>', '> ')).strip()
+
+
+def measure(engine, name, context, request, repeat):
+    template = engine.get_template(name)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        template.render(context, request)
+        latencies.append(time.perf_counter() - started)
+    return summary(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=10,
+                        help='Постов на странице.')
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+    setup_django()
+    from django.core.paginator import Paginator
+    from django.test import RequestFactory, override_settings
+    from django.urls import resolve
+
+    from posts.models import Post
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(
+        DEBUG=False,
+        MEDIA_ROOT=media_root,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }},
+    ).enable()
+    destroy = create_database()
+    try:
+        data = seed(50, 10, args.posts * 10, args.posts, images=0)
+        author = data['author']
+        posts = list(Post.objects.select_related('author', 'group'))
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve('/')
+        request.user = data['reader']
+        context = {
+            'title': 'Последние обновления на сайте',
+            'page_obj': Paginator(posts, args.posts).get_page(2),
+            'feed_key': '',
+            'feed_timeout': 0,
+            'group': data['group'],
+            'author': author,
+            'count': len(posts),
+            'following': True,
+            'user_not_author': False,
+        }
+        engines = {'django': backend('inlined'), 'jinja2': jinja2_backend()}
+        for name in TEMPLATES:
+            rendered = {
+                engine: normalize(
+                    engines[engine].get_template(name).render(
+                        context, request
+                    )
+                )
+                for engine in engines
+            }
+            if rendered['django'] != rendered['jinja2']:
+                print(f'{name}: HTML движков отличается')
+        print(f'Постов на странице: {args.posts}')
+        print(f'{"шаблон":<22} {"движок":<7} {"p50, мс":>8} {"p95, мс":>8}')
+        for name in TEMPLATES:
+            for engine in engines:
+                result = measure(
+                    engines[engine], name, context, request, args.repeat
+                )
+                print(f'{name:<22} {engine:<7} {result["p50"]:8.2f} '
+                      f'{result["p95"]:8.2f}')
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
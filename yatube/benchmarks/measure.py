@@ -0,0 +1,77 @@
+"""Замеры для бенчмарков: перцентили задержек и память процесса."""
+import json
+import os
+import resource
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу, values не обязаны быть отсортированы."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1,
+                       round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summary(latencies):
+    """p50/p95/p99 в миллисекундах по задержкам в секундах."""
+    return {
+        f'p{int(fraction * 100)}': percentile(latencies, fraction) * 1000
+        for fraction in (0.5, 0.95, 0.99)
+    }
+
+
+def rss_mb():
+    """Текущий RSS процесса в МБ (Linux), иначе пиковый."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux - в КБ, в macOS - в байтах.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 10 if os.uname().sysname == 'Linux' else peak / 2 ** 20
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump(results, baseline, ensure_ascii=False, indent=2,
+                  sort_keys=True)
+        baseline.write('\n')
+
+
+def compare(results, baseline, metric='p95', tolerance=0.25):
+    """Строки сравнения с базовой линией и признак регрессии.
+
+    Регрессия - рост metric больше чем на tolerance или рост числа
+    запросов к базе.
+    """
+    lines = []
+    regressed = False
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            lines.append(f'{name:<32} нет в базовой линии')
+            continue
+        change = current[metric] / before[metric] - 1 if before[metric] else 0
+        more_queries = current['queries'] > before['queries']
+        flag = ''
+        if change > tolerance or more_queries:
+            flag = '  РЕГРЕССИЯ'
+            regressed = True
+        lines.append(
+            f'{name:<32} {metric} {before[metric]:8.2f} -> '
+            f'{current[metric]:8.2f} мс ({change:+.0%}), запросов '
+            f'{before["queries"]:.1f} -> {current["queries"]:.1f}{flag}'
+        )
+    return lines, regressed
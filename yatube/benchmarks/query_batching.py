@@ -0,0 +1,102 @@
+"""Профиль и пост на сетевой базе: запросы по очереди против пула потоков.
+
+К каждому запросу к базе добавляется задержка --latency миллисекунд,
+как круговой путь до сервера базы в сети. QUERY_BATCH_WORKERS = 0
+выполняет независимые запросы представлений по очереди, больше нуля -
+одновременно (posts/batching.py). Соединения постоянные в обоих
+режимах, кэш отключён, чтобы каждая страница шла в базу.
+
+    python -m benchmarks.query_batching --latency 2 --requests 200
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from . import setup_django
+from .measure import summary
+
+
+def add_latency(seconds):
+    """Задержка перед каждым запросом во всех новых соединениях."""
+    from django.db.backends.signals import connection_created
+
+    def delayed(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delayed)
+
+    connection_created.connect(install, weak=False)
+
+
+def measure(client, url, requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: {response.status_code}')
+        latencies.append(time.perf_counter() - started)
+    return summary(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=2,
+                        help='Задержка запроса к базе, мс.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--posts', type=int, default=2000)
+    args = parser.parse_args()
+    setup_django()
+    from django.db import connections
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(
+        DEBUG=False,
+        MEDIA_ROOT=media_root,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }},
+        POST_THUMBNAIL_WORKERS=0,
+    ).enable()
+    destroy = create_database()
+    try:
+        data = seed(200, 20, args.posts, args.posts * 2, images=0)
+        connections.databases['default']['CONN_MAX_AGE'] = 60
+        connections.close_all()
+        add_latency(args.latency / 1000)
+        client = Client()
+        client.force_login(data['reader'])
+        urls = {
+            'profile': reverse(
+                'posts:profile', args=[data['author'].username]
+            ),
+            'post_detail': reverse(
+                'posts:post_detail', args=[data['post'].pk]
+            ),
+        }
+        print(f'Задержка запроса к базе: {args.latency:g} мс')
+        print(f'{"страница":<12} {"потоков":>7} {"p50, мс":>8} '
+              f'{"p95, мс":>8}')
+        for name, url in urls.items():
+            for workers in (0, args.workers):
+                with override_settings(QUERY_BATCH_WORKERS=workers):
+                    # Прогрев: соединения потоков пула открываются заранее.
+                    measure(client, url, args.workers)
+                    result = measure(client, url, args.requests)
+                print(f'{name:<12} {workers:>7} {result["p50"]:8.1f} '
+                      f'{result["p95"]:8.1f}')
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
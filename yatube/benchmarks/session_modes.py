@@ -0,0 +1,117 @@
+"""Лента подписок авторизованных читателей при разных SESSION_MODE.
+
+Читатели в нескольких процессах открывают ленту подписок, писатель
+публикует посты через форму - как в benchmarks.db_concurrency.
+Режимы: db (сессия из django_session в каждом запросе), cached_db
+(сессия из кэша; здесь у каждого процесса свой locmem и свой читатель,
+сайт же с cached_db запускается только с общим memcached или redis)
+и signed_cookies (сессия в куке, без базы).
+
+    python -m benchmarks.session_modes --readers 4 --seconds 5
+"""
+import argparse
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from . import setup_django
+from .db_concurrency import worker, writer
+from .measure import summary
+
+
+def reader(data):
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    client.force_login(data['reader'])
+    url = reverse('posts:follow_index')
+
+    def request():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: {response.status_code}')
+    return request
+
+
+def run(mode, data, args):
+    from django.conf import settings
+    from django.db import connection
+    from django.test import override_settings
+
+    with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[mode]):
+        # Дочерние процессы не должны делить соединение родителя.
+        connection.close()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        results = context.Queue()
+        workers = [('read', reader)] * args.readers
+        if args.writer:
+            workers.append(('write', writer))
+        processes = [
+            context.Process(
+                target=worker, args=(kind, make, data, stop, results)
+            )
+            for kind, make in workers
+        ]
+        for process in processes:
+            process.start()
+        time.sleep(args.seconds)
+        stop.set()
+        latencies = {'read': [], 'write': []}
+        errors = []
+        for _ in processes:
+            kind, values, failures = results.get()
+            latencies[kind] += values
+            errors += failures
+        for process in processes:
+            process.join()
+    reads = summary(latencies['read'])
+    print(
+        f'{mode:<15} {len(latencies["read"]) / args.seconds:10.1f} '
+        f'{reads["p50"]:8.1f} {reads["p95"]:8.1f} '
+        f'{len(latencies["write"]) / args.seconds:8.1f} {len(errors):7}'
+    )
+    for error in sorted(set(errors)):
+        print(f'    {error}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument(
+        '--no-writer', dest='writer', action='store_false',
+        help='Без публикации постов во время чтения.',
+    )
+    parser.add_argument(
+        '--modes', nargs='+', choices=('db', 'cached_db', 'signed_cookies'),
+        default=('db', 'cached_db', 'signed_cookies'),
+    )
+    args = parser.parse_args()
+    setup_django()
+    from django.test import override_settings
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(
+        DEBUG=False, MEDIA_ROOT=media_root, POST_THUMBNAIL_WORKERS=0,
+    ).enable()
+    destroy = create_database()
+    try:
+        data = seed(args.users, 20, args.posts, args.posts * 2, images=0)
+        print(f'{"режим":<15} {"запросов/с":>10} {"p50, мс":>8} '
+              f'{"p95, мс":>8} {"постов/с":>8} {"ошибок":>7}')
+        for mode in args.modes:
+            run(mode, data, args)
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Время отрисовки главной страницы на 10 и 100 постов по загрузчикам.
+
+- include: шаблоны читаются с диска на каждую страницу, как при DEBUG,
+  статья включается через {% include %};
+- cached: cached.Loader, статья всё ещё через {% include %};
+- inlined: cached.Loader поверх core.loaders.InliningLoader, статья
+  подставлена в цикл ленты (TEMPLATE_CACHE=1).
+
+Посты загружаются один раз, кэш фрагментов отключён: меряется только
+поиск и отрисовка шаблона.
+
+    python -m benchmarks.template_render --repeat 300
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from . import setup_django
+from .measure import summary
+
+FILE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def loaders(mode):
+    from django.conf import settings
+
+    if mode == 'include':
+        return FILE_LOADERS
+    if mode == 'cached':
+        return [('django.template.loaders.cached.Loader', FILE_LOADERS)]
+    return [('django.template.loaders.cached.Loader', [
+        ('core.loaders.InliningLoader', FILE_LOADERS,
+         settings.TEMPLATE_INLINE_INCLUDES),
+    ])]
+
+
+def backend(mode):
+    from django.conf import settings
+    from django.template.backends.django import DjangoTemplates
+
+    options = dict(settings.TEMPLATES[0]['OPTIONS'], loaders=loaders(mode))
+    return DjangoTemplates({
+        'NAME': mode,
+        'DIRS': settings.TEMPLATES[0]['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': options,
+    })
+
+
+def measure(mode, context, request, repeat):
+    engine = backend(mode)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        engine.get_template('posts/index.html').render(context, request)
+        latencies.append(time.perf_counter() - started)
+    return summary(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=300)
+    parser.add_argument('--sizes', type=int, nargs='+', default=(10, 100))
+    args = parser.parse_args()
+    setup_django()
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.paginator import Paginator
+    from django.test import RequestFactory, override_settings
+
+    from posts.models import Post
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(
+        DEBUG=False,
+        MEDIA_ROOT=media_root,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }},
+    ).enable()
+    destroy = create_database()
+    try:
+        seed(50, 10, max(args.sizes), max(args.sizes), images=0)
+        posts = list(Post.objects.select_related('author', 'group'))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        print(f'{"постов":>6} {"загрузчик":<9} {"p50, мс":>8} '
+              f'{"p95, мс":>8}')
+        for size in args.sizes:
+            context = {
+                'title': 'Последние обновления на сайте',
+                'page_obj': Paginator(posts, size).get_page(1),
+                'feed_key': '',
+                'feed_timeout': 0,
+            }
+            for mode in ('include', 'cached', 'inlined'):
+                result = measure(mode, context, request, args.repeat)
+                print(f'{size:>6} {mode:<9} {result["p50"]:8.2f} '
+                      f'{result["p95"]:8.2f}')
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""Задержки и число запросов к базе для всех адресов posts/urls.py.
+
+Наполняет одноразовую базу синтетическими данными (benchmarks.dataset)
+и опрашивает каждый адрес через тестовый клиент Django и через
+настоящий WSGI-сервер (wsgiref в отдельном потоке). Выводит p50/p95/p99,
+среднее число запросов к базе и память процесса, сравнивает результат
+с базовой линией.
+
+    python -m benchmarks.urls --requests 50
+    python -m benchmarks.urls --save-baseline benchmarks/baselines/urls.json
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from http.cookiejar import Cookie, CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import (HTTPCookieProcessor, HTTPRedirectHandler,
+                            build_opener)
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from . import setup_django
+from .measure import (compare, load_baseline, peak_rss_mb, rss_mb,
+                      save_baseline, summary)
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'urls.json')
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# Адрес: имя в posts/urls.py, аргументы, пользователь (None - аноним),
+# метод, данные формы и параметры запроса.
+Route = namedtuple(
+    'Route', 'name kwargs user method data params',
+    defaults=({}, None, 'get', None, None),
+)
+
+
+def routes(data):
+    author = data['author'].username
+    post_id = data['post'].pk
+    return [
+        Route('index'),
+        Route('group_list', {'slug': data['group'].slug}),
+        Route('profile', {'username': author}),
+        Route('post_detail', {'post_id': post_id}),
+        Route('search', params={'q': data['query']}),
+        Route('post_create', user='author'),
+        Route('post_edit', {'post_id': post_id}, user='author'),
+        Route('add_comment', {'post_id': post_id}, user='reader',
+              method='post', data={'text': 'Комментарий'}),
+        Route('follow_index', user='reader'),
+        Route('profile_follow', {'username': author}, user='reader'),
+        Route('profile_unfollow', {'username': author}, user='reader'),
+    ]
+
+
+def check_coverage(table):
+    """Все адреса posts/urls.py должны быть в таблице бенчмарка."""
+    from posts.urls import urlpatterns
+
+    missing = {pattern.name for pattern in urlpatterns} - {
+        route.name for route in table
+    }
+    if missing:
+        sys.exit(f'Нет сценария для адресов: {", ".join(sorted(missing))}')
+
+
+def url_of(route):
+    from django.urls import reverse
+
+    url = reverse(f'posts:{route.name}', kwargs=route.kwargs)
+    return f'{url}?{urlencode(route.params)}' if route.params else url
+
+
+class ClientDriver:
+    """Запросы через django.test.Client внутри процесса."""
+    name = 'client'
+
+    def __init__(self, users):
+        from django.test import Client
+
+        self.clients = {None: Client()}
+        for key, user in users.items():
+            self.clients[key] = Client()
+            self.clients[key].force_login(user)
+
+    def request(self, route):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = self.clients[route.user]
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if route.method == 'post':
+                response = client.post(url_of(route), route.data)
+            else:
+                response = client.get(url_of(route))
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'{url_of(route)}: {response.status_code}')
+        return elapsed, len(queries)
+
+
+class QueryCounter:
+    """WSGI-обёртка, которая считает запросы к базе на каждый запрос."""
+
+    def __init__(self, application):
+        self.application = application
+        self.last = 0
+
+    def __call__(self, environ, start_response):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.application(environ, start_response)
+        self.last = len(queries)
+        return response
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class WSGIDriver:
+    """Запросы по HTTP к wsgiref-серверу с приложением yatube."""
+    name = 'wsgi'
+
+    def __init__(self, users):
+        from django.conf import settings
+        from django.core.wsgi import get_wsgi_application
+        from django.test import Client
+
+        self.app = QueryCounter(get_wsgi_application())
+        self.server = make_server(
+            '127.0.0.1', 0, self.app, handler_class=QuietHandler
+        )
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        self.openers = {None: self.opener(None)}
+        for key, user in users.items():
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            self.openers[key] = self.opener(session)
+        self.tokens = {}
+
+    def opener(self, session):
+        from django.conf import settings
+
+        jar = CookieJar()
+        if session:
+            jar.set_cookie(Cookie(
+                0, settings.SESSION_COOKIE_NAME, session, None, False,
+                '127.0.0.1', False, False, '/', True, False, None, True,
+                None, None, {},
+            ))
+        return build_opener(HTTPCookieProcessor(jar), NoRedirect)
+
+    def csrf_token(self, user):
+        # Токен берётся из формы, как это делает браузер.
+        if user not in self.tokens:
+            from django.urls import reverse
+
+            page = self.openers[user].open(
+                self.base + reverse('posts:post_create')
+            ).read().decode()
+            self.tokens[user] = CSRF_INPUT.search(page).group(1)
+        return self.tokens[user]
+
+    def request(self, route):
+        opener = self.openers[route.user]
+        body = None
+        if route.method == 'post':
+            body = urlencode({
+                **route.data,
+                'csrfmiddlewaretoken': self.csrf_token(route.user),
+            }).encode()
+        started = time.perf_counter()
+        try:
+            with opener.open(self.base + url_of(route), body) as response:
+                response.read()
+        except HTTPError as error:
+            if error.code >= 400:
+                raise
+        elapsed = time.perf_counter() - started
+        return elapsed, self.app.last
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run(driver, table, requests, warmup, cold):
+    from django.core.cache import cache
+
+    results = {}
+    for route in table:
+        latencies = []
+        queries = []
+        for number in range(warmup + requests):
+            if cold:
+                cache.clear()
+            elapsed, count = driver.request(route)
+            if number >= warmup:
+                latencies.append(elapsed)
+                queries.append(count)
+        result = summary(latencies)
+        result['queries'] = sum(queries) / len(queries)
+        results[f'{driver.name}:{route.name}'] = result
+        print(
+            f'{driver.name + ":" + route.name:<32} {result["p50"]:8.2f} '
+            f'{result["p95"]:8.2f} {result["p99"]:8.2f} '
+            f'{result["queries"]:8.1f}'
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument(
+        '--modes', nargs='+', choices=('client', 'wsgi'),
+        default=('client', 'wsgi'),
+    )
+    parser.add_argument(
+        '--cold', action='store_true',
+        help='Очищать кэш перед каждым запросом.',
+    )
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument(
+        '--save-baseline', metavar='PATH',
+        help='Записать результаты как новую базовую линию.',
+    )
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    setup_django()
+    from django.test import override_settings
+
+    from .dataset import create_database, seed
+
+    media_root = tempfile.mkdtemp(prefix='yatube_bench_media_')
+    override_settings(DEBUG=False, MEDIA_ROOT=media_root).enable()
+    destroy = create_database()
+    try:
+        started = time.perf_counter()
+        data = seed(args.users, args.groups, args.posts, args.comments)
+        print(f'Данные созданы за {time.perf_counter() - started:.1f} с, '
+              f'RSS {rss_mb():.0f} МБ')
+        table = routes(data)
+        check_coverage(table)
+        users = {'author': data['author'], 'reader': data['reader']}
+        print(f'{"адрес":<32} {"p50, мс":>8} {"p95, мс":>8} '
+              f'{"p99, мс":>8} {"запросы":>8}')
+        results = {}
+        for mode in args.modes:
+            driver = (ClientDriver if mode == 'client' else WSGIDriver)(users)
+            try:
+                results.update(run(
+                    driver, table, args.requests, args.warmup, args.cold
+                ))
+            finally:
+                if hasattr(driver, 'close'):
+                    driver.close()
+        print(f'RSS {rss_mb():.0f} МБ, пиковый {peak_rss_mb():.0f} МБ')
+    finally:
+        destroy()
+        shutil.rmtree(media_root, ignore_errors=True)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f'Базовая линия записана в {args.save_baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        return
+    lines, regressed = compare(
+        results, load_baseline(args.baseline), tolerance=args.tolerance
+    )
+    print('\nСравнение с базовой линией:')
+    print('\n'.join(lines))
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
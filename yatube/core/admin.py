@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'subject', 'recipients', 'status', 'attempts',
+        'next_attempt_at', 'last_error',
+    )
+    list_filter = ('status',)
+    exclude = ('message',)
+    readonly_fields = ('subject', 'from_email', 'recipients', 'created')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        queryset.update(
+            status=QueuedEmail.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+    retry.short_description = 'Отправить ещё раз'
+
+
+admin.site.register(QueuedEmail, QueuedEmailAdmin)
@@ -0,0 +1,44 @@
+# core/cache.py
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.memcached import BaseMemcachedCache
+
+
+class PyMemcacheCache(BaseMemcachedCache):
+    """Кэш на memcached через pymemcache с пулом соединений.
+
+    В Django 2.2 такого бэкенда нет (он появился в 3.2), поэтому
+    используем собственный с тем же поведением. Один клиент на процесс
+    держит пул соединений к каждому серверу, потоки берут из него
+    свободное соединение.
+    """
+
+    def __init__(self, server, params):
+        import pymemcache
+        import pymemcache.serde
+        super().__init__(
+            server, params,
+            library=pymemcache,
+            value_not_found_exception=KeyError,
+        )
+        self._options = {
+            'allow_unicode_keys': True,
+            'default_noreply': False,
+            'serde': pymemcache.serde.pickle_serde,
+            'use_pooling': True,
+            **self._options,
+        }
+
+    @property
+    def _cache(self):
+        if getattr(self, '_client', None) is None:
+            self._client = self._lib.HashClient(self._servers, **self._options)
+        return self._client
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._cache.touch(key, self.get_backend_timeout(timeout)))
+
+    def close(self, **kwargs):
+        # Соединения пула переиспользуются между запросами.
+        pass
@@ -0,0 +1,130 @@
+"""Шаблоны лент на Jinja2.
+
+Включается TEMPLATE_ENGINE=jinja2: бэкенд Jinja2 идёт в TEMPLATES
+первым и отдаёт шаблоны из папки jinja2/ (base.html, includes и ленты),
+остальные шаблоны по-прежнему отрисовывает Django. Окружение повторяет
+то, что шаблоны Django берут из тегов и фильтров: url, static,
+{% cache %}, date, urlencode и addclass из core.templatetags.user_filters.
+csrf_input и csrf_token добавляет в контекст сам бэкенд, год -
+контекстный процессор core.context_processors.year.
+"""
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import defaultfilters
+from django.template.backends import jinja2 as backend
+from django.template.backends.utils import csrf_input_lazy, csrf_token_lazy
+from django.templatetags.static import static
+from django.test.signals import template_rendered
+from django.urls import reverse
+from django.utils.timezone import template_localtime
+import jinja2
+from jinja2 import Undefined, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from . import profiling
+from .templatetags.user_filters import addclass
+
+
+def url(viewname, *args, **kwargs):
+    """Аналог тега {% url %}: url('posts:profile', post.author)."""
+    return reverse(viewname, args=args, kwargs=kwargs)
+
+
+def date(value, arg=None):
+    """Фильтр date Django: дата в часовом поясе сайта."""
+    return defaultfilters.date(template_localtime(value), arg)
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache timeout, 'имя', ключ... %} ... {% endcache %}.
+
+    Ключ и кэш те же, что у тега cache Django: фрагменты сбрасываются
+    одинаково для обоих движков.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        timeout, name, *vary_on = args
+        try:
+            cache = caches['template_fragments']
+        except InvalidCacheBackendError:
+            cache = caches['default']
+        key = make_template_fragment_key(name, vary_on)
+        value = cache.get(key)
+        if value is None:
+            value = str(caller())
+            cache.set(key, value, timeout)
+        return Markup(value)
+
+
+class SourceTemplate(jinja2.Template):
+    @property
+    def source(self):
+        """Текст шаблона, как Template.source у шаблонов Django."""
+        return self.environment.loader.get_source(
+            self.environment, self.name
+        )[0]
+
+
+class Environment(jinja2.Environment):
+    template_class = SourceTemplate
+
+
+def environment(**options):
+    # Как в шаблонах Django: неизвестная переменная - пустая строка,
+    # в том числе при DEBUG.
+    options['undefined'] = Undefined
+    options.setdefault('extensions', []).append(FragmentCacheExtension)
+    env = Environment(**options)
+    env.globals.update(url=url, static=static)
+    env.filters.update(
+        addclass=addclass,
+        date=date,
+        urlencode=defaultfilters.urlencode,
+    )
+    return env
+
+
+class Template(backend.Template):
+    """Шаблон, который сообщает об отрисовке сигналом template_rendered.
+
+    По сигналу тестовый клиент заполняет response.context
+    и response.templates, как для шаблонов Django.
+    """
+
+    @property
+    def name(self):
+        return self.template.name
+
+    def render(self, context=None, request=None):
+        context = {} if context is None else dict(context)
+        if request is not None:
+            context['request'] = request
+            context['csrf_input'] = csrf_input_lazy(request)
+            context['csrf_token'] = csrf_token_lazy(request)
+            for processor in self.backend.template_context_processors:
+                context.update(processor(request))
+        template_rendered.send(sender=self, template=self, context=context)
+        with profiling.timer('template'):
+            return self.template.render(context)
+
+
+class Jinja2(backend.Jinja2):
+    """Бэкенд Jinja2 Django с сигналом template_rendered."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
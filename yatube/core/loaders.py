@@ -0,0 +1,69 @@
+"""Загрузчик шаблонов, который подставляет текст include заранее.
+
+{% include %} в цикле ленты на каждый пост ищет шаблон, кладёт слой
+в контекст и отрисовывает отдельный шаблон. InliningLoader при загрузке
+заменяет {% include 'имя' %} без with и only на текст включаемого
+шаблона для имён из списка, и цикл отрисовывает узлы напрямую.
+Вместе с cached.Loader подстановка выполняется один раз на процесс.
+
+Не подставляются шаблоны с {% extends %} и {% block %}. Теги {% cycle %}
+и {% resetcycle %} после подстановки помнят состояние между итерациями
+внешнего цикла, поэтому их во включаемых шаблонах быть не должно.
+"""
+import re
+
+from django.template import Origin, TemplateDoesNotExist
+from django.template.loaders.base import Loader
+
+INCLUDE = re.compile(r"""{%\s*include\s+(['"])([^'"]+)\1\s*%}""")
+NOT_INLINED = re.compile(r'{%\s*(extends|block)\b')
+
+
+class InliningLoader(Loader):
+    """Оборачивает загрузчики loaders, подставляет шаблоны из inline."""
+
+    def __init__(self, engine, loaders, inline=()):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+        self.inline = frozenset(inline)
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            for source in loader.get_template_sources(template_name):
+                # cached.Loader читает текст через origin.loader,
+                # поэтому источник отдаётся от имени этого загрузчика.
+                origin = Origin(
+                    name=source.name,
+                    template_name=source.template_name,
+                    loader=self,
+                )
+                origin.source = source
+                yield origin
+
+    def get_contents(self, origin, parents=()):
+        contents = origin.source.loader.get_contents(origin.source)
+        parents = (*parents, origin.template_name)
+
+        def inline(match):
+            name = match.group(2)
+            if name not in self.inline or name in parents:
+                return match.group(0)
+            included = self.find_contents(name, parents)
+            if NOT_INLINED.search(included):
+                return match.group(0)
+            return included
+
+        return INCLUDE.sub(inline, contents)
+
+    def find_contents(self, template_name, parents):
+        tried = []
+        for origin in self.get_template_sources(template_name):
+            try:
+                return self.get_contents(origin, parents)
+            except TemplateDoesNotExist:
+                tried.append((origin, 'Source does not exist'))
+        raise TemplateDoesNotExist(template_name, tried=tried)
+
+    def reset(self):
+        for loader in self.loaders:
+            loader.reset()
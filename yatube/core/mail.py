@@ -0,0 +1,176 @@
+"""Очередь исходящих писем.
+
+QueuedEmailBackend только записывает письма в таблицу QueuedEmail,
+запрос не ждёт почтовый сервер. Команда send_queued_mail отправляет
+их пачками через EMAIL_DELIVERY_BACKEND по одному соединению,
+с повторами и ограничением скорости.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд письмо закреплено за отправителем: если процесс
+# упадёт, письмо снова станет доступно после этого срока.
+LEASE_SECONDS: int = 300
+# Задержка перед повтором: RETRY_DELAY * 2 ** (попытка - 1), не больше часа.
+RETRY_DELAY: int = 60
+MAX_RETRY_DELAY: int = 60 * 60
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Ставит письма в очередь вместо отправки."""
+
+    def send_messages(self, email_messages):
+        queued = [
+            QueuedEmail(
+                subject=str(message.subject)[:255],
+                from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+                recipients='\n'.join(message.recipients()),
+                message=message.message().as_bytes(),
+            )
+            for message in email_messages
+            if message.recipients()
+        ]
+        QueuedEmail.objects.bulk_create(queued)
+        return len(queued)
+
+
+class RawMessage:
+    """Готовое MIME-сообщение с интерфейсом, который ждут бэкенды Django."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        if linesep == '\n':
+            return self.data
+        return self.data.replace(b'\n', linesep.encode())
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(linesep=linesep).decode()
+
+    def get_charset(self):
+        return None
+
+
+class QueuedMessage(EmailMessage):
+    """Письмо из очереди: отправляется ровно в том виде, в каком встало."""
+
+    def __init__(self, queued):
+        super().__init__(
+            subject=queued.subject,
+            from_email=queued.from_email,
+            to=queued.recipients.split('\n'),
+        )
+        self.data = bytes(queued.message)
+
+    def message(self):
+        return RawMessage(self.data)
+
+
+def claim(batch_size):
+    """Забирает пачку писем, которым пора уйти, на LEASE_SECONDS.
+
+    На PostgreSQL строки, которые уже забрал другой процесс, пропускаются
+    через SKIP LOCKED. Где его нет (SQLite), письмо забирается условным
+    UPDATE по прежнему next_attempt_at: если другой процесс успел продлить
+    срок первым, строка не обновится и в пачку не попадёт.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=LEASE_SECONDS)
+    due = QueuedEmail.objects.filter(
+        status=QueuedEmail.PENDING, next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'pk')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            batch = list(due.select_for_update(skip_locked=True)[:batch_size])
+            QueuedEmail.objects.filter(
+                pk__in=[item.pk for item in batch]
+            ).update(next_attempt_at=lease)
+            return batch
+        return [
+            item for item in due[:batch_size]
+            if QueuedEmail.objects.filter(
+                pk=item.pk, next_attempt_at=item.next_attempt_at
+            ).update(next_attempt_at=lease)
+        ]
+
+
+def _retry(item, error, max_attempts):
+    item.attempts += 1
+    item.last_error = f'{type(error).__name__}: {error}'
+    if item.attempts >= max_attempts:
+        item.status = QueuedEmail.FAILED
+    else:
+        delay = min(RETRY_DELAY * 2 ** (item.attempts - 1), MAX_RETRY_DELAY)
+        item.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    item.save(update_fields=(
+        'attempts', 'last_error', 'status', 'next_attempt_at'
+    ))
+
+
+def _close(backend):
+    try:
+        backend.close()
+    except Exception:
+        pass
+
+
+def send_batch(batch, backend, max_attempts, rate=0):
+    """Отправляет пачку по одному соединению backend.
+
+    rate - не больше писем в секунду (0 - без ограничения). Возвращает
+    число отправленных писем; неотправленные ждут повтора.
+    """
+    sent = []
+    started = time.monotonic()
+    for number, item in enumerate(batch):
+        if rate:
+            delay = started + number / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            # Открытое заранее соединение бэкенд не закрывает после письма.
+            backend.open()
+            backend.send_messages([QueuedMessage(item)])
+        except Exception as error:
+            logger.warning('Письмо %s не отправлено: %s', item.pk, error)
+            _retry(item, error, max_attempts)
+            # После ошибки соединение может быть уже непригодно.
+            _close(backend)
+            continue
+        sent.append(item.pk)
+    QueuedEmail.objects.filter(pk__in=sent).delete()
+    return len(sent)
+
+
+def send_queued(batch_size=None, max_attempts=None, rate=None):
+    """Отправляет все письма, которым пора уйти. Возвращает их число."""
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_QUEUE_MAX_ATTEMPTS
+    rate = settings.EMAIL_QUEUE_RATE if rate is None else rate
+    if rate:
+        # Пачка должна уйти, пока не истёк срок, на который она забрана.
+        batch_size = max(1, min(batch_size, int(rate * LEASE_SECONDS)))
+    backend = get_connection(
+        settings.EMAIL_DELIVERY_BACKEND, fail_silently=False
+    )
+    total = 0
+    try:
+        while True:
+            batch = claim(batch_size)
+            if not batch:
+                return total
+            total += send_batch(batch, backend, max_attempts, rate)
+    finally:
+        _close(backend)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.sessions import delete_expired, session_model
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные сессии из базы пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько сессий удалять одной транзакцией.',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками, секунды.',
+        )
+
+    def handle(self, *args, **options):
+        if session_model() is None:
+            self.stdout.write('Сессии хранятся не в базе, удалять нечего.')
+            return
+        started = time.monotonic()
+        deleted = delete_expired(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено сессий: {deleted} за '
+            f'{time.monotonic() - started:.1f} с'
+        ))
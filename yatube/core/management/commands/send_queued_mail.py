@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import send_queued
+from core.models import QueuedEmail
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди через EMAIL_DELIVERY_BACKEND.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько писем забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--max-attempts', type=int,
+            help='После скольких неудач письмо больше не отправляется.',
+        )
+        parser.add_argument(
+            '--rate', type=float,
+            help='Не больше писем в секунду, 0 - без ограничения.',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а проверять очередь каждые --interval с.',
+        )
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            sent = send_queued(
+                options['batch_size'], options['max_attempts'],
+                options['rate'],
+            )
+            if sent or not options['loop']:
+                failed = QueuedEmail.objects.filter(
+                    status=QueuedEmail.FAILED
+                ).count()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Отправлено писем: {sent} за '
+                    f'{time.monotonic() - started:.1f} с, '
+                    f'не отправлено совсем: {failed}'
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,129 @@
+import cProfile
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.text import slugify
+
+from . import profiling, routers
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+
+class ReplicaPinMiddleware:
+    """Разрешает чтение с реплик в безопасных запросах.
+
+    Запросы на запись и все запросы в течение REPLICA_PIN_SECONDS после
+    записи (по cookie) читают основную базу: автор сразу видит свой пост
+    или комментарий, даже если реплика ещё не догнала основную базу.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in ('GET', 'HEAD', 'OPTIONS')
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        with routers.replica_reads(enabled=not pinned) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Замеры каждого запроса при PROFILING = True.
+
+    Время и число запросов к базе, время шаблонов, попадания в кэш
+    и построение миниатюр уходят в заголовок Server-Timing и в
+    гистограммы /metrics/. Запрос с ?profile=1 (или заголовком
+    X-Profile: 1) от персонала или с токеном METRICS_TOKEN выгружает
+    профиль cProfile в PROFILING_DIR, profile=pyinstrument - отчёт
+    pyinstrument, если он установлен.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        profiling.install()
+
+    def __call__(self, request):
+        for alias in settings.CACHES:
+            profiling.instrument_cache(caches[alias])
+        record, token = profiling.start()
+        try:
+            with profiling.instrumented():
+                mode = self.profile_mode(request)
+                if mode:
+                    response, dump = self.profile(request, mode)
+                else:
+                    response = self.get_response(request)
+            duration = record.elapsed()
+        finally:
+            profiling.finish(token)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if match and match.url_name == 'metrics':
+            return response
+        profiling.METRICS.observe(view, duration, record)
+        response['Server-Timing'] = profiling.server_timing(
+            record, view, duration
+        )
+        if mode:
+            response['X-Profile'] = dump
+        return response
+
+    def profile_mode(self, request):
+        mode = request.GET.get('profile') or request.META.get(
+            'HTTP_X_PROFILE'
+        )
+        if not mode or not profiling.is_authorized(request):
+            return None
+        if mode == 'pyinstrument' and Profiler is not None:
+            return mode
+        return 'cprofile'
+
+    def profile(self, request, mode):
+        """Ответ и имя файла с профилем запроса."""
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        slug = slugify(request.path) or 'index'
+        name = (
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-'
+            f'{uuid.uuid4().hex[:8]}'
+        )
+        if mode == 'pyinstrument':
+            profiler = Profiler()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            name += '.html'
+            path = os.path.join(settings.PROFILING_DIR, name)
+            with open(path, 'w', encoding='utf-8') as report:
+                report.write(profiler.output_html())
+            return response, name
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        name += '.prof'
+        profiler.dump_stats(os.path.join(settings.PROFILING_DIR, name))
+        return response, name
@@ -1,5 +1,6 @@
 # core/models.py
 from django.db import models
+from django.utils import timezone
 
 
 class PubDateModel(models.Model):
@@ -13,3 +14,51 @@ class PubDateModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class QueuedEmail(models.Model):
+    """Письмо в очереди на отправку (core.mail.QueuedEmailBackend).
+
+    Хранится готовое MIME-сообщение и конверт: отправитель и получатели.
+    Отправленные письма удаляются из очереди, письма, которые не ушли
+    за EMAIL_QUEUE_MAX_ATTEMPTS попыток, остаются со статусом «ошибка».
+    """
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (FAILED, 'Ошибка'),
+    )
+
+    subject = models.CharField('Тема', max_length=255, blank=True)
+    from_email = models.CharField('Отправитель', max_length=254)
+    recipients = models.TextField(
+        'Получатели',
+        help_text='Адреса конверта, по одному в строке',
+    )
+    message = models.BinaryField('Письмо', help_text='Сообщение MIME')
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now,
+        help_text='Раньше этого времени письмо не отправляется',
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        ordering = ('pk',)
+        indexes = (
+            models.Index(
+                fields=('status', 'next_attempt_at'),
+                name='queued_email_due_idx',
+            ),
+        )
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
+
+    def __str__(self):
+        return self.subject
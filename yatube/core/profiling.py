@@ -0,0 +1,292 @@
+"""Замеры запросов: SQL, шаблоны, кэш и построение миниатюр.
+
+Включаются настройкой PROFILING. Замеры текущего запроса собираются
+в Record, после ответа попадают в гистограммы METRICS, которые
+представление core.views.metrics отдаёт в текстовом формате Prometheus.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Границы корзин гистограммы длительности запросов, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('profiling_record', default=None)
+_missing = object()
+
+
+class Record:
+    """Замеры одного запроса: суммарное время и число событий по имени."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+        # Вложенность шаблонов: время считается только у внешнего.
+        self.depth = 0
+        # Запросы к базе могут идти из потоков posts/batching.py.
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds, count=1):
+        with self.lock:
+            self.timings[name] += seconds
+            self.counts[name] += count
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+# Счётчики по представлениям: имя метрики, описание и значение из Record.
+COUNTERS = (
+    ('yatube_sql_queries_total', 'Запросы к базе.',
+     lambda record: record.counts['sql']),
+    ('yatube_sql_seconds_total', 'Время запросов к базе.',
+     lambda record: record.timings['sql']),
+    ('yatube_template_seconds_total', 'Время отрисовки шаблонов.',
+     lambda record: record.timings['template']),
+    ('yatube_cache_hits_total', 'Попадания в кэш.',
+     lambda record: record.counts['cache_hit']),
+    ('yatube_cache_misses_total', 'Промахи кэша.',
+     lambda record: record.counts['cache_miss']),
+    ('yatube_thumbnail_seconds_total', 'Построение миниатюр в запросе.',
+     lambda record: record.timings['thumbnail']),
+)
+
+
+class Metrics:
+    """Гистограммы длительности и счётчики по представлениям в процессе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            # Замеры вне запросов, например миниатюры в фоновом пуле.
+            self.tasks = defaultdict(lambda: [0, 0.0])
+
+    def observe(self, view, duration, record):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = {
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                    'count': 0,
+                    'sum': 0.0,
+                    'counters': [0] * len(COUNTERS),
+                }
+            stats['buckets'][bisect_left(BUCKETS, duration)] += 1
+            stats['count'] += 1
+            stats['sum'] += duration
+            for number, (_, _, value) in enumerate(COUNTERS):
+                stats['counters'][number] += value(record)
+
+    def observe_task(self, name, seconds):
+        with self.lock:
+            task = self.tasks[name]
+            task[0] += 1
+            task[1] += seconds
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self.lock:
+            views = sorted(self.views.items())
+            tasks = sorted(self.tasks.items())
+        name = 'yatube_request_duration_seconds'
+        lines = [
+            f'# HELP {name} Длительность запроса.',
+            f'# TYPE {name} histogram',
+        ]
+        for view, stats in views:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), stats['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{view="{view}",le="{bound}"}} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{{view="{view}"}} {stats["sum"]:.6f}')
+            lines.append(f'{name}_count{{view="{view}"}} {stats["count"]}')
+        for number, (counter, description, _) in enumerate(COUNTERS):
+            lines.append(f'# HELP {counter} {description}')
+            lines.append(f'# TYPE {counter} counter')
+            for view, stats in views:
+                lines.append(
+                    f'{counter}{{view="{view}"}} {stats["counters"][number]:g}'
+                )
+        lines.append('# HELP yatube_task_seconds_total Фоновые задачи.')
+        lines.append('# TYPE yatube_task_seconds_total counter')
+        for task, (count, seconds) in tasks:
+            lines.append(
+                f'yatube_task_seconds_total{{task="{task}"}} {seconds:.6f}'
+            )
+            lines.append(f'yatube_task_total{{task="{task}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def start():
+    """Начинает замеры запроса, возвращает запись и токен для finish."""
+    record = Record()
+    return record, _current.set(record)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timer(name):
+    """Добавляет время блока к замерам текущего запроса.
+
+    Вне запроса (в фоновых потоках) время идёт в счётчики задач.
+    """
+    if not settings.PROFILING:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record = _current.get()
+        if record is None:
+            METRICS.observe_task(name, elapsed)
+        else:
+            record.add(name, elapsed)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: время и число запросов."""
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.add('sql', time.perf_counter() - started)
+
+
+@contextmanager
+def instrumented():
+    """Считает запросы к базе в блоке, если идут замеры запроса.
+
+    Соединения свои у каждого потока, поэтому обёртка ставится
+    на соединения текущего потока.
+    """
+    with ExitStack() as stack:
+        if _current.get() is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql_wrapper))
+        yield
+
+
+def _instrument_templates():
+    from django.template.base import Template
+
+    render = Template.render
+    if getattr(render, 'profiled', False):
+        return
+
+    def profiled_render(self, context):
+        record = _current.get()
+        if record is None or record.depth:
+            return render(self, context)
+        record.depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            record.depth -= 1
+            record.add('template', time.perf_counter() - started)
+
+    profiled_render.profiled = True
+    Template.render = profiled_render
+
+
+def _count_cache(started, hits, misses):
+    record = _current.get()
+    if record is not None:
+        seconds = time.perf_counter() - started
+        with record.lock:
+            record.timings['cache'] += seconds
+            record.counts['cache'] += 1
+            record.counts['cache_hit'] += hits
+            record.counts['cache_miss'] += misses
+
+
+def instrument_cache(cache):
+    """Считает попадания и промахи get/get_many у объекта кэша.
+
+    Объекты кэша в Django 2.2 свои у каждого потока, поэтому обёртки
+    ставятся на объект, а не на класс бэкенда.
+    """
+    if getattr(cache, '_profiled', False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    def profiled_get(key, default=None, **kwargs):
+        started = time.perf_counter()
+        value = get(key, _missing, **kwargs)
+        found = value is not _missing
+        _count_cache(started, int(found), int(not found))
+        return value if found else default
+
+    def profiled_get_many(keys, **kwargs):
+        keys = list(keys)
+        started = time.perf_counter()
+        values = get_many(keys, **kwargs)
+        _count_cache(started, len(values), len(keys) - len(values))
+        return values
+
+    cache.get = profiled_get
+    cache.get_many = profiled_get_many
+    cache._profiled = True
+
+
+def install():
+    """Подключает замеры шаблонов, один раз на процесс."""
+    _instrument_templates()
+
+
+def server_timing(record, view, duration):
+    """Значение заголовка Server-Timing.
+
+    Описания латиницей: заголовки WSGI должны быть в latin-1.
+    """
+    def ms(seconds):
+        return f'{seconds * 1000:.1f}'
+
+    parts = [
+        f'total;dur={ms(duration)};desc="{view}"',
+        f'sql;dur={ms(record.timings["sql"])};'
+        f'desc="{record.counts["sql"]} queries"',
+        f'tpl;dur={ms(record.timings["template"])}',
+        f'cache;dur={ms(record.timings["cache"])};'
+        f'desc="{record.counts["cache_hit"]} hits, '
+        f'{record.counts["cache_miss"]} misses"',
+    ]
+    if record.counts['thumbnail']:
+        parts.append(f'thumb;dur={ms(record.timings["thumbnail"])}')
+    return ', '.join(parts)
+
+
+def is_authorized(request):
+    """Доступ к метрикам и профилям: персонал или токен METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(header, f'Bearer {token}'):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
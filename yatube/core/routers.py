@@ -0,0 +1,84 @@
+"""Чтение с реплик базы.
+
+Реплики читаются только внутри запросов, которые пропустил
+ReplicaPinMiddleware (core/middleware.py): GET без недавней записи.
+Команды, фоновые потоки и запросы на запись работают с основной базой,
+чтобы не читать отстающие от неё данные.
+"""
+import itertools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ReplicaState:
+    """Можно ли читать с реплик в текущем запросе и была ли запись."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.wrote = False
+
+
+_state = ContextVar('replica_state', default=None)
+_cycles = {}
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Разрешает чтение с реплик в блоке, отдаёт ReplicaState."""
+    state = ReplicaState(enabled)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def read_primary():
+    """Дальше в текущем запросе читать только основную базу."""
+    state = _state.get()
+    if state is not None:
+        state.enabled = False
+
+
+def choose_replica():
+    """Реплика по DATABASE_REPLICA_POLICY: по кругу или случайно по весам."""
+    replicas = settings.DATABASE_REPLICAS
+    aliases = tuple(replicas)
+    if settings.DATABASE_REPLICA_POLICY == 'weighted':
+        return random.choices(aliases, [replicas[a] for a in aliases])[0]
+    cycle = _cycles.get(aliases)
+    if cycle is None:
+        cycle = _cycles.setdefault(aliases, itertools.cycle(aliases))
+    return next(cycle)
+
+
+class ReplicaRouter:
+    """Чтение с реплик из DATABASE_REPLICAS, запись в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is None or not state.enabled
+                or not settings.DATABASE_REPLICAS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            # Явно, иначе Django читает связанные объекты из той же базы,
+            # откуда пришёл объект.
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # После записи запрос дочитывает данные из основной базы.
+            state.wrote = True
+            state.enabled = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
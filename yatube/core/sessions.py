@@ -0,0 +1,68 @@
+"""Сессии: проверка кэша и удаление просроченных сессий пачками.
+
+clearsessions из Django удаляет все просроченные сессии одним DELETE,
+который на большой таблице надолго блокирует запись в SQLite.
+Здесь каждая пачка удаляется своей короткой транзакцией.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+# Движки, которые читают сессию из кэша SESSION_CACHE_ALIAS.
+CACHE_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def check_session_cache():
+    """Не даёт хранить сессии в кэше, который у каждого процесса свой.
+
+    Выход или смена пароля удаляет сессию только из locmem того
+    процесса, который обработал запрос: остальные продолжают её
+    принимать.
+    """
+    if settings.SESSION_ENGINE not in CACHE_ENGINES:
+        return
+    if isinstance(caches[settings.SESSION_CACHE_ALIAS], LocMemCache):
+        raise ImproperlyConfigured(
+            f'{settings.SESSION_ENGINE} требует общего кэша: задайте '
+            'CACHE_BACKEND memcached, redis или file.'
+        )
+
+
+def session_model():
+    """Модель сессий SESSION_ENGINE или None, если сессии не в базе."""
+    engine = import_module(settings.SESSION_ENGINE)
+    try:
+        return engine.SessionStore.get_model_class()
+    except AttributeError:
+        return None
+
+
+def delete_expired(batch_size=None, pause=0):
+    """Удаляет просроченные сессии, возвращает их число.
+
+    pause - секунды между пачками, чтобы пропускать запись постов.
+    """
+    model = session_model()
+    if model is None:
+        return 0
+    batch_size = batch_size or settings.SESSION_CLEANUP_BATCH_SIZE
+    now = timezone.now()
+    total = 0
+    while True:
+        keys = list(
+            model.objects.filter(expire_date__lt=now)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not keys:
+            return total
+        total += model.objects.filter(pk__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
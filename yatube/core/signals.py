@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению SQLite.
+
+    journal_mode=wal сохраняется в файле базы, остальные настройки
+    действуют только в пределах соединения.
+    """
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать.
+
+    В Django 2.2 нет CONN_HEALTH_CHECKS (он появился в 4.1): без проверки
+    запрос на соединении, оборванном сервером или пулером, падает.
+    Закрытое соединение откроется заново при первом запросе к базе.
+    """
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
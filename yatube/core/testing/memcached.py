@@ -0,0 +1,211 @@
+# core/testing/memcached.py
+"""Локальная замена memcached для тестов и бенчмарков.
+
+Поддерживает текстовый протокол в объёме, которым пользуется
+pymemcache: get/gets, set/add/replace, delete, incr/decr, touch,
+flush_all и version. Считает попадания и промахи чтения.
+"""
+import socketserver
+import threading
+import time
+
+# Сроки жизни больше 30 дней memcached считает unix-временем.
+RELATIVE_EXPIRE_LIMIT: int = 60 * 60 * 24 * 30
+
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().split()
+            if not parts:
+                continue
+            command, args = parts[0], parts[1:]
+            if command == 'quit':
+                return
+            handler = getattr(self, f'do_{command}', None)
+            if handler is None:
+                self.reply('ERROR')
+                continue
+            handler(args)
+
+    def reply(self, *lines, noreply=False):
+        if noreply:
+            return
+        self.wfile.write(
+            b''.join(
+                (line if isinstance(line, bytes) else line.encode()) + b'\r\n'
+                for line in lines
+            )
+        )
+
+    def do_version(self, args):
+        self.reply('VERSION 1.6.0-standin')
+
+    def do_get(self, args, with_cas=False):
+        lines = []
+        for key in args:
+            item = self.server.lookup(key)
+            if item is None:
+                continue
+            value, flags = item
+            header = f'VALUE {key} {flags} {len(value)}'
+            if with_cas:
+                header += ' 0'
+            lines.extend((header, value))
+        self.reply(*lines, 'END')
+
+    def do_gets(self, args):
+        self.do_get(args, with_cas=True)
+
+    def _store(self, args, mode):
+        key, flags, exptime, size = args[:4]
+        noreply = len(args) > 4 and args[4] == 'noreply'
+        value = self.rfile.read(int(size) + 2)[:-2]
+        stored = self.server.store(key, value, int(flags), int(exptime), mode)
+        self.reply('STORED' if stored else 'NOT_STORED', noreply=noreply)
+
+    def do_set(self, args):
+        self._store(args, 'set')
+
+    def do_add(self, args):
+        self._store(args, 'add')
+
+    def do_replace(self, args):
+        self._store(args, 'replace')
+
+    def do_delete(self, args):
+        deleted = self.server.delete(args[0])
+        self.reply(
+            'DELETED' if deleted else 'NOT_FOUND',
+            noreply='noreply' in args[1:],
+        )
+
+    def _change(self, args, sign):
+        value = self.server.change(args[0], sign * int(args[1]))
+        self.reply(
+            'NOT_FOUND' if value is None else str(value),
+            noreply='noreply' in args[2:],
+        )
+
+    def do_incr(self, args):
+        self._change(args, 1)
+
+    def do_decr(self, args):
+        self._change(args, -1)
+
+    def do_touch(self, args):
+        touched = self.server.touch(args[0], int(args[1]))
+        self.reply(
+            'TOUCHED' if touched else 'NOT_FOUND',
+            noreply='noreply' in args[2:],
+        )
+
+    def do_flush_all(self, args):
+        self.server.flush()
+        self.reply('OK', noreply='noreply' in args)
+
+
+class MemcachedServer(socketserver.ThreadingTCPServer):
+    """Сервер в отдельном потоке текущего процесса.
+
+    Пример:
+        with MemcachedServer() as server:
+            settings.CACHES['default']['LOCATION'] = server.location
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), MemcachedHandler)
+        self._items = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._thread = None
+
+    @property
+    def location(self):
+        host, port = self.server_address
+        return f'{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def _deadline(exptime):
+        if exptime == 0:
+            return None
+        if exptime < 0:
+            return 0
+        if exptime <= RELATIVE_EXPIRE_LIMIT:
+            return time.time() + exptime
+        return exptime
+
+    def _alive(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        deadline = item[2]
+        if deadline is not None and deadline <= time.time():
+            del self._items[key]
+            return None
+        return item
+
+    def lookup(self, key):
+        with self._lock:
+            item = self._alive(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[0], item[1]
+
+    def store(self, key, value, flags, exptime, mode):
+        with self._lock:
+            exists = self._alive(key) is not None
+            if (mode == 'add' and exists) or (mode == 'replace'
+                                              and not exists):
+                return False
+            self._items[key] = (value, flags, self._deadline(exptime))
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._items.pop(key, None) is not None
+
+    def change(self, key, delta):
+        with self._lock:
+            item = self._alive(key)
+            if item is None:
+                return None
+            value = max(int(item[0]) + delta, 0)
+            self._items[key] = (str(value).encode(), item[1], item[2])
+            return value
+
+    def touch(self, key, exptime):
+        with self._lock:
+            item = self._alive(key)
+            if item is None:
+                return False
+            self._items[key] = (item[0], item[1], self._deadline(exptime))
+            return True
+
+    def flush(self):
+        with self._lock:
+            self._items.clear()
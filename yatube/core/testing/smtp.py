@@ -0,0 +1,118 @@
+"""Локальная замена SMTP-сервера для тестов.
+
+Понимает HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP и QUIT, складывает
+принятые письма в messages. Вместо smtpd, которого нет в Python 3.12,
+и aiosmtpd, который не входит в зависимости.
+"""
+import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.connections += 1
+        self.reset()
+        self.reply('220 standin ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode().strip().partition(' ')
+            handler = getattr(self, f'do_{command.lower()}', None)
+            if handler is None:
+                self.reply('502 Command not implemented')
+                continue
+            if handler(argument) is False:
+                return
+
+    def reset(self):
+        self.sender = None
+        self.recipients = []
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def do_helo(self, argument):
+        self.reply('250 standin')
+
+    def do_ehlo(self, argument):
+        self.reply('250 standin')
+
+    def do_noop(self, argument):
+        self.reply('250 OK')
+
+    def do_rset(self, argument):
+        self.reset()
+        self.reply('250 OK')
+
+    def do_mail(self, argument):
+        self.sender = argument.partition(':')[2].strip('<>')
+        self.reply('250 OK')
+
+    def do_rcpt(self, argument):
+        self.recipients.append(argument.partition(':')[2].strip('<>'))
+        self.reply('250 OK')
+
+    def do_data(self, argument):
+        self.reply('354 End data with <CR><LF>.<CR><LF>')
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if line in (b'.\r\n', b''):
+                break
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        data = b''.join(lines)
+        if self.server.accept(self.sender, self.recipients, data):
+            self.reply('250 OK: queued')
+        else:
+            self.reply('451 Try again later')
+        self.reset()
+
+    def do_quit(self, argument):
+        self.reply('221 Bye')
+        return False
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """Сервер в отдельном потоке текущего процесса.
+
+    fail_next - сколько следующих писем отклонить временной ошибкой 451.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), SMTPHandler)
+        self._lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def accept(self, sender, recipients, data):
+        with self._lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                return False
+            self.messages.append((sender, recipients, data))
+            return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,613 @@
+# core/tests.py
+import asyncio
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Context, Engine, engines
+from django.template.loader_tags import IncludeNode
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Post
+
+from . import mail as mail_queue
+from . import profiling, routers
+from .asgi import WSGIToASGI, build_environ
+from .models import QueuedEmail
+from .sessions import check_session_cache
+from .testing.memcached import MemcachedServer
+from .testing.smtp import SMTPServer
+
+try:
+    import pymemcache
+except ImportError:
+    pymemcache = None
+
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
+
+User = get_user_model()
+
+
+@skipUnless(pymemcache, 'Для бэкенда memcached нужен pymemcache')
+class PyMemcacheCacheTest(TestCase):
+    """Проверяем бэкенд memcached на локальной замене сервера."""
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MemcachedServer().start()
+        cls.settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.PyMemcacheCache',
+                'LOCATION': cls.server.location,
+            }
+        })
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        cls.server.stop()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_operations(self):
+        self.assertTrue(cache.add('key', {'value': 1}))
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertEqual(cache.get('key'), {'value': 1})
+        cache.set('counter', 10, None)
+        self.assertEqual(cache.incr('counter'), 11)
+        self.assertEqual(cache.decr('counter', 2), 9)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        self.assertEqual(
+            cache.get_many(['key', 'counter', 'missing']),
+            {'key': {'value': 1}, 'counter': 9}
+        )
+        self.assertTrue(cache.touch('key', 60))
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        cache.set('expired', 1, 0)
+        self.assertIsNone(cache.get('expired'))
+
+    def test_feed_fragment_is_shared(self):
+        """Фрагмент ленты берётся из общего кэша при повторном запросе."""
+        user = User.objects.create_user(username='HasNoName')
+        Post.objects.create(author=user, text='Текст поста.')
+        self.client.get(reverse('posts:index'))
+        hits = self.server.hits
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Текст поста.')
+        self.assertGreater(self.server.hits, hits)
+
+
+PROFILES_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    PROFILING=True, PROFILING_DIR=PROFILES_DIR, METRICS_TOKEN='secret'
+)
+class ProfilingMiddlewareTest(TestCase):
+    """Проверяем замеры запросов, /metrics и выгрузку профиля."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.staff = User.objects.create_user(username='Staff', is_staff=True)
+        Post.objects.create(author=cls.user, text='Текст поста.')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(PROFILES_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        profiling.METRICS.reset()
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('desc="posts:index"', timing)
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'tpl;dur=[1-9]')
+        self.assertRegex(timing, r'hits, [1-9]\d* misses"')
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('hits, 0 misses"', response['Server-Timing'])
+
+    def test_metrics(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertContains(
+            response,
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+        )
+        self.assertContains(response, 'yatube_sql_queries_total')
+        self.assertNotContains(response, 'view="metrics"')
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_profile_dump(self):
+        url = reverse('posts:index') + '?profile=1'
+        response = self.client.get(url)
+        self.assertNotIn('X-Profile', response)
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertTrue(os.path.isfile(
+            os.path.join(PROFILES_DIR, response['X-Profile'])
+        ))
+
+    @override_settings(PROFILING=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Настройки только для SQLite')
+class SQLitePragmasTest(SimpleTestCase):
+    """Новое соединение SQLite получает настройки из SQLITE_PRAGMAS."""
+
+    @override_settings(SQLITE_PRAGMAS={
+        'synchronous': 'normal', 'cache_size': -2048, 'busy_timeout': 1234,
+    })
+    def test_pragmas_applied(self):
+        default = connections['default']
+        wrapper = default.__class__(
+            default.settings_dict.copy(), alias='pragmas'
+        )
+        try:
+            with wrapper.cursor() as cursor:
+                values = []
+                for name in ('synchronous', 'cache_size', 'busy_timeout'):
+                    cursor.execute(f'PRAGMA {name}')
+                    values.append(cursor.fetchone()[0])
+        finally:
+            wrapper.close()
+        # synchronous=normal - это 1.
+        self.assertEqual(values, [1, -2048, 1234])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Реплика - второй файл SQLite')
+@override_settings(DATABASE_REPLICAS={'replica': 1})
+class ReplicaRouterTest(TransactionTestCase):
+    """Чтение с реплики и закрепление за основной базой после записи.
+
+    Реплика - отдельный файл SQLite без репликации, поэтому по данным
+    страницы видно, из какой базы она прочитана.
+    """
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases['replica'] = {
+            **connections.databases['default'],
+            'NAME': cls.replica_path,
+            'TEST': {'NAME': cls.replica_path},
+        }
+        super().setUpClass()
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='HasNoName')
+        User.objects.using('replica').bulk_create([self.user])
+        Post.objects.using('replica').bulk_create([
+            Post(author=self.user, text='Пост только на реплике'),
+        ])
+
+    def test_reads_use_replica_until_write(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост только на реплике')
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+        self.assertNotContains(response, 'Пост только на реплике')
+        # Окно закрепления истекло: снова реплика (сессии на ней нет).
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост только на реплике')
+
+    def test_recent_bump_reads_primary(self):
+        # Пост есть только в основной базе: реплика отстаёт.
+        Post.objects.create(author=self.user, text='Пост без реплики')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост без реплики')
+        self.assertNotContains(response, 'Пост только на реплике')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertFalse(Post.objects.exists())
+        with routers.replica_reads():
+            self.assertTrue(Post.objects.exists())
+
+    @override_settings(DATABASE_REPLICAS={'first': 1, 'second': 3})
+    def test_replica_policies(self):
+        router = routers.ReplicaRouter()
+        with routers.replica_reads():
+            picks = [router.db_for_read(Post) for _ in range(4)]
+            self.assertEqual(sorted(picks), ['first', 'first',
+                                             'second', 'second'])
+            self.assertNotEqual(picks[0], picks[1])
+            with override_settings(DATABASE_REPLICA_POLICY='weighted'):
+                picks = [router.db_for_read(Post) for _ in range(400)]
+        self.assertGreater(picks.count('second'), picks.count('first'))
+
+
+class EmailQueueTest(TestCase):
+    """Письма встают в очередь и уходят командой на замену SMTP-сервера."""
+    @classmethod
+    def setUpClass(cls):
+        cls.server = SMTPServer().start()
+        cls.settings_override = override_settings(
+            EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+            EMAIL_DELIVERY_BACKEND='django.core.mail.backends.smtp.'
+                                   'EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=cls.server.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_QUEUE_RATE=0,
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.messages.clear()
+        self.server.connections = 0
+        self.server.fail_next = 0
+
+    def send_queued(self):
+        call_command('send_queued_mail', stdout=open(os.devnull, 'w'))
+
+    def test_password_reset_is_queued(self):
+        User.objects.create_user(
+            username='HasNoName', email='user@test.ru', password='secret'
+        )
+        response = self.client.post(
+            reverse('users:password_reset_form'), {'email': 'user@test.ru'}
+        )
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+        self.assertEqual(self.server.messages, [])
+        self.send_queued()
+        (sender, recipients, data), = self.server.messages
+        self.assertEqual(recipients, ['user@test.ru'])
+        self.assertIn(b'/auth/reset/', data)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    def test_batch_uses_one_connection(self):
+        for number in range(3):
+            mail.send_mail(f'Письмо {number}', 'Текст', None, ['a@test.ru'])
+        self.send_queued()
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_failed_message_is_retried(self):
+        mail.send_mail('Письмо', 'Текст', None, ['a@test.ru'])
+        self.server.fail_next = 1
+        with self.assertLogs('core.mail', 'WARNING'):
+            self.send_queued()
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('451', queued.last_error)
+        # Повтор - не раньше, чем через RETRY_DELAY.
+        self.send_queued()
+        self.assertEqual(self.server.messages, [])
+        QueuedEmail.objects.update(next_attempt_at=queued.created)
+        self.send_queued()
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    @skipIf(connection.features.has_select_for_update_skip_locked,
+            'Строки пропускает SKIP LOCKED')
+    def test_rows_claimed_by_another_worker_are_skipped(self):
+        for number in range(3):
+            mail.send_mail(f'Письмо {number}', 'Текст', None, ['a@test.ru'])
+        taken = QueuedEmail.objects.order_by('pk').first()
+        raced = []
+
+        def other_worker(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            # Другой процесс забирает письмо сразу после нашей выборки.
+            if sql.startswith('SELECT') and not raced:
+                raced.append(sql)
+                QueuedEmail.objects.filter(pk=taken.pk).update(
+                    next_attempt_at=timezone.now() + timedelta(minutes=5)
+                )
+            return result
+
+        with connection.execute_wrapper(other_worker):
+            batch = mail_queue.claim(10)
+        self.assertTrue(raced)
+        self.assertEqual(len(batch), 2)
+        self.assertNotIn(taken, batch)
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=1)
+    def test_message_fails_after_max_attempts(self):
+        mail.send_mail('Письмо', 'Текст', None, ['a@test.ru'])
+        self.server.fail_next = 1
+        with self.assertLogs('core.mail', 'WARNING'):
+            self.send_queued()
+        self.assertEqual(QueuedEmail.objects.get().status, QueuedEmail.FAILED)
+
+
+class WSGIToASGITest(SimpleTestCase):
+    """Проверяем ASGI-адаптер поверх WSGI-приложения."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from django.core.wsgi import get_wsgi_application
+        cls.application = WSGIToASGI(get_wsgi_application(), threads=2)
+
+    def call(self, scope, messages):
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.application(scope, receive, send))
+        return sent
+
+    def test_get(self):
+        start, body = self.call({
+            'type': 'http',
+            'method': 'GET',
+            'path': reverse('about:author'),
+            'query_string': b'',
+            'headers': [(b'host', b'testserver')],
+        }, [{'type': 'http.request', 'body': b''}])
+        self.assertEqual(start['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), start['headers']
+        )
+        self.assertIn('</html>', body['body'].decode())
+
+    def test_environ(self):
+        environ = build_environ({
+            'method': 'POST',
+            'path': '/поиск/',
+            'query_string': b'q=1',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'content-length', b'4'),
+                (b'x-forwarded-for', b'1.1.1.1'),
+                (b'x-forwarded-for', b'2.2.2.2'),
+                (b'cookie', b'sessionid=abc'),
+                (b'cookie', b'csrftoken=def'),
+            ],
+            'client': ('10.0.0.1', 5000),
+        }, None)
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['CONTENT_LENGTH'], '4')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+        self.assertEqual(
+            environ['HTTP_COOKIE'], 'sessionid=abc; csrftoken=def'
+        )
+        self.assertEqual(environ['QUERY_STRING'], 'q=1')
+        self.assertEqual(
+            environ['PATH_INFO'].encode('latin-1').decode(), '/поиск/'
+        )
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+
+    def test_disconnect_before_body(self):
+        sent = self.call(
+            {'type': 'http', 'method': 'POST', 'path': '/'},
+            [{'type': 'http.disconnect'}],
+        )
+        self.assertEqual(sent, [])
+
+
+class InliningLoaderTest(SimpleTestCase):
+    """{% include %} из списка подставляется текстом при загрузке."""
+
+    templates = {
+        'feed.html': (
+            "{% for post in posts %}{% include 'item.html' %}{% endfor %}"
+            "{% include 'page.html' %}{% include 'loop.html' %}"
+        ),
+        'item.html': '{% load l10n %}<p>{{ post|unlocalize }}</p>',
+        'page.html': "{% extends 'base.html' %}",
+        'base.html': '<hr>',
+        'loop.html': "{% if not stop %}{% include 'loop.html' %}{% endif %}",
+    }
+
+    def engine(self, cached=False):
+        loaders = [('core.loaders.InliningLoader', [
+            ('django.template.loaders.locmem.Loader', self.templates),
+        ], ['item.html', 'page.html', 'loop.html'])]
+        if cached:
+            loaders = [('django.template.loaders.cached.Loader', loaders)]
+        return Engine(
+            loaders=loaders, libraries={'l10n': 'django.templatetags.l10n'}
+        )
+
+    def includes(self, template):
+        return [node.template.var for node in
+                template.nodelist.get_nodes_by_type(IncludeNode)]
+
+    def test_inlined(self):
+        for cached in (False, True):
+            with self.subTest(cached=cached):
+                template = self.engine(cached).get_template('feed.html')
+                # Шаблон с extends и рекурсивный include не подставляются.
+                self.assertEqual(self.includes(template),
+                                 ['page.html', 'loop.html'])
+                self.assertEqual(
+                    template.render(Context({'posts': [1000], 'stop': 1})),
+                    '<p>1000</p><hr>',
+                )
+
+    def test_feed_templates(self):
+        for name in ('posts/index.html', 'posts/group_list.html',
+                     'posts/profile.html', 'posts/follow.html',
+                     'posts/search.html'):
+            with self.subTest(name=name):
+                template = engines['django'].get_template(name).template
+                self.assertNotIn('includes/article.html',
+                                 self.includes(template))
+
+
+@skipUnless(jinja2, 'Для шаблонов Jinja2 нужен jinja2')
+class Jinja2TemplatesTest(TestCase):
+    """Ленты отрисовывает Jinja2, остальные страницы - Django."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        self.post = Post.objects.create(author=self.author, text='Пост <b>')
+        self.client.force_login(self.author)
+        engine = {
+            'BACKEND': 'core.jinja2.Jinja2',
+            'DIRS': [os.path.join(settings.BASE_DIR, 'jinja2')],
+            'OPTIONS': {
+                'environment': 'core.jinja2.environment',
+                'context_processors': settings.TEMPLATES[0]['OPTIONS'][
+                    'context_processors'
+                ],
+            },
+        }
+        override = override_settings(
+            TEMPLATES=[engine, settings.TEMPLATES[-1]]
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_feed(self):
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertIsInstance(response.templates[0].template,
+                              jinja2.Template)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertContains(response, 'Пост &lt;b&gt;')
+        self.assertContains(response, 'Лев Толстой')
+        self.assertContains(response, f'© {response.context["year"]}')
+        self.assertContains(
+            response, reverse('posts:post_detail', args=[self.post.pk])
+        )
+
+    def test_other_pages_use_django(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertTemplateUsed(response, 'includes/header.html')
+
+
+class SessionModesTest(TestCase):
+    """Сессии в подписанной куке и в кэше не читают django_session."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+
+    def session_queries(self, engine):
+        with self.settings(SESSION_ENGINE=engine):
+            self.client.force_login(self.user)
+            url = reverse('posts:follow_index')
+            self.assertEqual(self.client.get(url).status_code, 200)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+        return [query['sql'] for query in queries
+                if 'django_session' in query['sql']]
+
+    def test_database(self):
+        engine = settings.SESSION_ENGINES['db']
+        self.assertEqual(len(self.session_queries(engine)), 1)
+
+    def test_signed_cookies(self):
+        engine = settings.SESSION_ENGINES['signed_cookies']
+        self.assertEqual(self.session_queries(engine), [])
+
+    def test_cached_db(self):
+        engine = settings.SESSION_ENGINES['cached_db']
+        self.assertEqual(self.session_queries(engine), [])
+
+    def test_cached_db_requires_shared_cache(self):
+        with self.settings(SESSION_ENGINE=settings.SESSION_ENGINES['db']):
+            check_session_cache()
+        for mode in ('cached_db', 'cache'):
+            engine = f'django.contrib.sessions.backends.{mode}'
+            with self.subTest(engine=engine), self.settings(
+                SESSION_ENGINE=engine
+            ):
+                with self.assertRaises(ImproperlyConfigured):
+                    check_session_cache()
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_clear_expired_sessions(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(
+                session_key=f'key{number}',
+                session_data='',
+                expire_date=now + timedelta(days=1 if number < 2 else -1),
+            )
+            for number in range(7)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                'clear_expired_sessions', batch_size=2, stdout=StringIO()
+            )
+        self.assertEqual(
+            sorted(Session.objects.values_list('pk', flat=True)),
+            ['key0', 'key1'],
+        )
+        deletes = [query for query in queries
+                   if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'
+    )
+    def test_clear_without_database_sessions(self):
+        stdout = StringIO()
+        call_command('clear_expired_sessions', stdout=stdout)
+        self.assertIn('не в базе', stdout.getvalue())
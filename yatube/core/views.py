@@ -1,6 +1,11 @@
 # core/views.py
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import profiling
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -10,3 +15,15 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Гистограммы ProfilingMiddleware в текстовом формате Prometheus."""
+    if not settings.PROFILING:
+        raise Http404
+    if not profiling.is_authorized(request):
+        raise PermissionDenied
+    return HttpResponse(
+        profiling.METRICS.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,8 +1,177 @@
+import json
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Направления перехода по курсору.
+FORWARD: str = 'n'
+BACKWARD: str = 'p'
+
+# До этого числа строк оценку уточняем обычным COUNT(*).
+EXACT_COUNT_LIMIT: int = 10000
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации.
+
+    В отличие от обычной страницы не знает ни своего номера,
+    ни общего количества страниц, зато не требует COUNT(*) и OFFSET.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, cursor, has_next,
+                 has_previous):
+        super().__init__(object_list, 1, paginator)
+        self.cursor = cursor or ''
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        # repr используется как ключ фрагментного кэша, поэтому
+        # он должен различаться для разных курсоров.
+        return '<CursorPage %s>' % self.cursor
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(FORWARD, self.object_list[-1])
+
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(BACKWARD, self.object_list[0])
+
+
+class CursorPaginator(Paginator):
+    """Keyset (seek) пагинация по паре (pub_date, id) в порядке убывания.
+
+    Курсор - непрозрачный токен с направлением и ключом крайней записи
+    страницы, поэтому время выборки не зависит от глубины страницы.
+    key - поле или аннотация с датой вместо pub_date.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.key = key
+
+    def encode_cursor(self, direction, obj):
+        value = json.dumps(
+            [direction, getattr(obj, self.key).isoformat(), obj.pk]
+        )
+        return urlsafe_base64_encode(value.encode())
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, pub_date, id) или None."""
+        try:
+            direction, pub_date, pk = json.loads(
+                urlsafe_base64_decode(cursor).decode()
+            )
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if direction not in (FORWARD, BACKWARD) or pub_date is None:
+            return None
+        return direction, pub_date, pk
+
+    def get_page(self, cursor):
+        position = self.decode_cursor(cursor) if cursor else None
+        limit = self.per_page + 1
+        key = self.key
+        if position is None:
+            rows = list(self.object_list.order_by(f'-{key}', '-pk')[:limit])
+            return CursorPage(
+                rows[:self.per_page], self, cursor,
+                len(rows) > self.per_page, False
+            )
+        direction, pub_date, pk = position
+        if direction == FORWARD:
+            rows = list(
+                self.object_list.filter(
+                    Q(**{f'{key}__lt': pub_date})
+                    | Q(**{key: pub_date, 'pk__lt': pk})
+                ).order_by(f'-{key}', '-pk')[:limit]
+            )
+            return CursorPage(
+                rows[:self.per_page], self, cursor,
+                len(rows) > self.per_page, True
+            )
+        rows = list(
+            self.object_list.filter(
+                Q(**{f'{key}__gt': pub_date})
+                | Q(**{key: pub_date, 'pk__gt': pk})
+            ).order_by(key, 'pk')[:limit]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, cursor, bool(rows), has_previous)
+
+
+def estimated_count(model, using='default'):
+    """Оценка числа строк таблицы по статистике планировщика или None.
+
+    SQLite берёт её из sqlite_stat1 (заполняется командой ANALYZE),
+    PostgreSQL - из pg_class.reltuples.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # Статистики ещё нет: ANALYZE не запускался.
+        return None
+    if row is None:
+        return None
+    count = int(str(row[0]).split()[0])
+    return count if count >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки, который не считает всю таблицу.
+
+    Для выборки без фильтров число строк берётся из статистики базы,
+    точный COUNT(*) выполняется только для отфильтрованных выборок
+    и небольших таблиц.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(
+                self.object_list.model, self.object_list.db
+            )
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
 
 
-def paginator(request, posts):
+def paginator(request, posts, key='pub_date'):
+    cursor = request.GET.get('cursor')
+    if cursor is not None or settings.POSTS_PAGINATION == 'cursor':
+        return CursorPaginator(
+            posts, settings.POSTS_ON_PAGE, key=key
+        ).get_page(cursor)
     paginator = Paginator(posts, settings.POSTS_ON_PAGE)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
@@ -1,30 +1,101 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
+from .addons import EstimatedCountPaginator
 from .models import Comment, Follow, Group, Post
+from .search import filter_posts
+
+
+class SelectedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, у которого выбранный объект уже загружен.
+
+    AutocompleteSelect достаёт подпись выбранного варианта отдельным
+    запросом, в списке постов это был бы запрос на каждую строку.
+    """
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        if selected is None or [str(v) for v in value] != [str(selected.pk)]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, selected.pk, str(selected), True, len(options)
+        ))
+        return [(None, options, 0)]
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
     list_editable = ('group',)
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['widget'] = SelectedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'),
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        # Группа строки уже загружена через list_select_related,
+        # виджет берёт подпись из неё, а не отдельным запросом.
+        form_class = super().get_changelist_form(request, **kwargs)
+
+        class ChangelistForm(form_class):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                widget = self.fields['group'].widget
+                getattr(widget, 'widget', widget).selected = (
+                    self.instance.group
+                )
+
+        return ChangelistForm
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE '%...%'.
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
 
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('post', 'author', 'text', 'pub_date')
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    raw_id_fields = ('post', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
-    search_fields = ('author',)
-    list_filter = ('author', 'user',)
+    list_select_related = ('user', 'author')
+    # Фильтры по пользователям выводили бы список всех пользователей.
+    search_fields = ('=author__username', '=user__username')
+    raw_id_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,70 @@
+"""Независимые запросы страницы параллельно.
+
+run() выполняет функции с запросами к базе одновременно: первую в
+текущем потоке, остальные в пуле из QUERY_BATCH_WORKERS потоков со
+своими соединениями. На сетевой базе страница ждёт самый долгий
+запрос, а не сумму всех. Функции копируют контекст запроса, поэтому
+в потоках работают выбор реплики (core/routers.py) и замеры
+(core/profiling.py).
+
+Внутри транзакции и при QUERY_BATCH_WORKERS = 0 функции выполняются
+по очереди: другие потоки не видят незакоммиченные данные.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+from core import profiling
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.QUERY_BATCH_WORKERS,
+            thread_name_prefix='queries',
+        )
+    return _executor
+
+
+def _call(function):
+    try:
+        with profiling.instrumented():
+            return function()
+    finally:
+        # Соединение потока живёт CONN_MAX_AGE, как у потоков сервера.
+        close_old_connections()
+
+
+def is_concurrent():
+    """Пойдут ли запросы run() в потоки пула."""
+    return bool(
+        settings.QUERY_BATCH_WORKERS
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def run(*functions):
+    """Результаты функций в том же порядке.
+
+    Исключение первой по порядку упавшей функции поднимается после
+    того, как закончатся все остальные.
+    """
+    if len(functions) < 2 or not is_concurrent():
+        return [function() for function in functions]
+    executor = _get_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, _call, function)
+        for function in functions[1:]
+    ]
+    try:
+        first = functions[0]()
+    finally:
+        # Не оставляем запросы работать после ответа.
+        for future in futures:
+            future.exception()
+    return [first, *(future.result() for future in futures)]
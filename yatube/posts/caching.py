@@ -0,0 +1,206 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+
+from core import routers
+
+# Области ленты, у каждой свой счётчик поколений.
+ALL_POSTS: str = 'all'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follows_scope(user_id):
+    return f'follows:{user_id}'
+
+
+def _key(scope):
+    return f'posts:generation:{scope}'
+
+
+def _bumped_key(scope):
+    return f'posts:bumped:{scope}'
+
+
+def _initial():
+    # Начальное значение от времени: если счётчик вытеснили из кэша,
+    # новый не совпадёт ни с одним из прежних поколений.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """Текущие поколения областей ленты в порядке scopes.
+
+    Если поколение сдвинуто меньше REPLICA_PIN_SECONDS назад, реплика
+    может ещё не видеть записи: остаток запроса читает основную базу,
+    иначе под новым поколением закэшировались бы старые данные.
+    Отставание реплик дольше этого окна не учитывается.
+    """
+    keys = [_key(scope) for scope in scopes]
+    bumped = []
+    if settings.DATABASE_REPLICAS:
+        bumped = [_bumped_key(scope) for scope in scopes]
+    values = cache.get_many(keys + bumped)
+    if any(key in values for key in bumped):
+        routers.read_primary()
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сдвигает поколения: все закэшированные страницы областей устаревают."""
+    for scope in scopes:
+        key = _key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {_bumped_key(scope): 1 for scope in scopes},
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+
+def post_scopes(post):
+    scopes = [ALL_POSTS, author_scope(post.author_id)]
+    if post.group_id:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def author_scopes(user_id):
+    """Области всех страниц, где выводится имя пользователя.
+
+    Посты автора есть на главной, в группах и в профиле, комментарии -
+    на страницах постов, своё имя пользователь видит в шапке любой
+    страницы (ETag зрителя включает follows_scope).
+    """
+    from .models import Comment, Post
+
+    group_ids = Post.objects.filter(
+        author_id=user_id, group__isnull=False
+    ).values_list('group_id', flat=True).distinct()
+    post_ids = Comment.objects.filter(author_id=user_id).values_list(
+        'post_id', flat=True
+    ).distinct()
+    return [
+        ALL_POSTS,
+        author_scope(user_id),
+        follows_scope(user_id),
+        *(group_scope(group_id) for group_id in group_ids),
+        *(post_scope(post_id) for post_id in post_ids),
+    ]
+
+
+def feed_cache_key(request, *scopes):
+    """Ключ фрагмента ленты: поколения областей и параметры страницы.
+
+    При публикации, изменении или удалении поста поколение меняется
+    и ключ вместе с ним.
+    """
+    generations = ','.join(
+        f'{scope}={gen}'
+        for scope, gen in zip(scopes, get_generations(*scopes))
+    )
+    page = request.GET.get('page', '')
+    cursor = request.GET.get('cursor', '')
+    return f'{generations}:{settings.POSTS_PAGINATION}:{page}:{cursor}'
+
+
+def feed_context(request, *scopes):
+    """Переменные для тега {% cache feed_timeout <имя> feed_key %}."""
+    return {
+        'feed_key': feed_cache_key(request, *scopes),
+        'feed_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def _etag(request, *scopes):
+    """ETag страницы из поколений областей, зрителя и параметров запроса.
+
+    Зритель берётся из сессии, чтобы не загружать пользователя из базы.
+    Без общего кэша (CACHE_SHARED) поколения свои у каждого процесса,
+    и ETag не выдаётся: другой процесс ответил бы 304 на устаревшую
+    страницу. С репликами поколения всё равно читаются: condition
+    вызывает etag-функцию до представления, и get_generations успевает
+    закрепить запрос за основной базой.
+    """
+    viewer = request.session.get(SESSION_KEY, '')
+    if viewer:
+        scopes += (follows_scope(viewer),)
+    generations = get_generations(*scopes)
+    if not settings.CACHE_SHARED:
+        return None
+    raw = f'{viewer}:{request.GET.urlencode()}:{scopes}:{generations}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _uses_generations():
+    # Без ETag и реплик запрос ключа объекта не нужен.
+    return settings.CACHE_SHARED or bool(settings.DATABASE_REPLICAS)
+
+
+def index_etag(request):
+    return _etag(request, ALL_POSTS)
+
+
+def group_etag(request, slug):
+    from .models import Group
+
+    if not _uses_generations():
+        return None
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return _etag(request, group_scope(group_id))
+
+
+def profile_etag(request, username):
+    from .models import User
+
+    if not _uses_generations():
+        return None
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return _etag(request, author_scope(author_id))
+
+
+def post_etag(request, post_id):
+    from .models import Post
+
+    if not _uses_generations():
+        return None
+    ids = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if ids is None:
+        return None
+    author_id, group_id = ids
+    return _etag(
+        request,
+        post_scope(post_id),
+        author_scope(author_id),
+        group_scope(group_id),
+    )
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Поколения лент и ETag верны только с общим для процессов кэшем."""
+    if settings.CACHE_SHARED:
+        return []
+    return [Warning(
+        'Кэш не общий для процессов (CACHE_BACKEND=locmem): фрагменты '
+        'лент живут только FEED_CACHE_TIMEOUT секунд, ETag не выдаются.',
+        hint='Укажите CACHE_BACKEND=memcached, redis или file.',
+        id='posts.W001',
+    )]
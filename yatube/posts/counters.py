@@ -0,0 +1,93 @@
+from itertools import islice
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Размер пачки при массовой записи счётчиков.
+BATCH_SIZE: int = 1000
+
+
+def change_user_stats(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя через F()-выражение.
+
+    Запись статистики создаётся при первом увеличении счётчика;
+    уменьшение никогда не опускает счётчик ниже нуля.
+    """
+    from .models import UserStats
+
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats.filter(**{f'{field}__gte': -delta}).update(
+            **{field: F(field) + delta}
+        )
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        UserStats.objects.get_or_create(user_id=user_id)
+        stats.update(**{field: F(field) + delta})
+
+
+def change_comment_count(post_id, delta):
+    """Атомарно меняет счётчик комментариев поста."""
+    from .models import Post
+
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comment_count__gte=-delta)
+    posts.update(comment_count=F('comment_count') + delta)
+
+
+def _count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def rebuild_counters(apps=global_apps):
+    """Пересчитывает все денормализованные счётчики с нуля.
+
+    apps - реестр приложений, по умолчанию текущий.
+    Возвращает количество записей статистики пользователей.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    users = User.objects.annotate(
+        post_total=_count_of(Post, 'author'),
+        follower_total=_count_of(Follow, 'author'),
+        following_total=_count_of(Follow, 'user'),
+    ).values_list(
+        'pk', 'post_total', 'follower_total', 'following_total'
+    ).iterator(chunk_size=BATCH_SIZE)
+    stats = (
+        UserStats(
+            user_id=pk,
+            post_count=posts,
+            follower_count=followers,
+            following_count=following,
+        )
+        for pk, posts, followers, following in users
+    )
+    total = 0
+    with transaction.atomic():
+        Post.objects.update(comment_count=_count_of(Comment, 'post'))
+        UserStats.objects.all().delete()
+        while True:
+            batch = list(islice(stats, BATCH_SIZE))
+            if not batch:
+                break
+            UserStats.objects.bulk_create(batch)
+            total += len(batch)
+    return total
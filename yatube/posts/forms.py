@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import check_upload, normalize_upload
 
 
 class PostForm(forms.ModelForm):
@@ -18,6 +20,14 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка к посту.'
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохранённую картинку поста повторно не обрабатываем.
+        if not isinstance(image, UploadedFile):
+            return image
+        check_upload(image)
+        return normalize_upload(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,45 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import build_thumbnail, is_stale
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры картинок постов параллельно на всех ядрах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить все миниатюры, а не только недостающие.',
+        )
+        parser.add_argument(
+            '--jobs', type=int, default=os.cpu_count(),
+            help='Количество рабочих процессов.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        post_ids = [
+            post.pk
+            for post in posts.only('image', 'thumbnail').iterator()
+            if options['all'] or is_stale(post)
+        ]
+        started = time.monotonic()
+        if options['jobs'] > 1:
+            # Дочерние процессы открывают свои соединения с базой.
+            connections.close_all()
+            with ProcessPoolExecutor(options['jobs']) as executor:
+                built = sum(
+                    executor.map(build_thumbnail, post_ids, chunksize=16)
+                )
+        else:
+            built = sum(build_thumbnail(post_id) for post_id in post_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено миниатюр: {built} за '
+            f'{time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Follow, Post
+from posts.transfer import FIELDS, FORMATS, guess_format, write_records
+
+# Что выгружается для каждого вида записей: без создания объектов
+# моделей, только кортежи значений в порядке FIELDS.
+QUERIES = {
+    'posts': lambda: Post.objects.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    ),
+    'comments': lambda: Comment.objects.order_by('pk').values_list(
+        'pk', 'post_id', 'author__username', 'text', 'pub_date'
+    ),
+    'follows': lambda: Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username'
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии или подписки в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки, по умолчанию стандартный вывод.',
+        )
+        parser.add_argument(
+            '--kind', choices=tuple(FIELDS), default='posts',
+            help='Что выгружать.',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат, по умолчанию по расширению файла.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        kind = options['kind']
+        rows = QUERIES[kind]().iterator(chunk_size=options['chunk_size'])
+        started = time.monotonic()
+        if path == '-':
+            total = write_records(self.stdout, fmt, FIELDS[kind], rows)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                total = write_records(stream, fmt, FIELDS[kind], rows)
+        elapsed = time.monotonic() - started
+        # Отчёт в stderr, чтобы не смешиваться с выгрузкой в stdout.
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено записей: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} в секунду)'
+        ))
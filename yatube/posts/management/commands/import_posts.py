@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import caching, search, timeline
+from posts.counters import rebuild_counters
+from posts.models import Comment, Follow, Group, Post
+from posts.transfer import (FIELDS, FORMATS, guess_format, keep_pub_date,
+                            read_records)
+
+User = get_user_model()
+
+MODELS = {'posts': Post, 'comments': Comment, 'follows': Follow}
+
+
+class Command(BaseCommand):
+    help = 'Загружает посты, комментарии или подписки из NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для загрузки, "-" - стандартный ввод.'
+        )
+        parser.add_argument(
+            '--kind', choices=tuple(FIELDS), default='posts',
+            help='Что загружать.',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат, по умолчанию по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей вставлять одной транзакцией.',
+        )
+        parser.add_argument(
+            '--images-dir', default='',
+            help='Папка, от которой отсчитываются пути картинок.',
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        self.kind = options['kind']
+        self.images_dir = options['images_dir']
+        self.verbosity = options['verbosity']
+        # Авторы и группы ищутся по словарям, а не запросом на запись.
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.scopes = set()
+        self.skipped = 0
+        build = getattr(self, f'build_{self.kind}')
+        model = MODELS[self.kind]
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as error:
+                raise CommandError(error)
+        started = time.monotonic()
+        total = 0
+        # ignore_conflicts не сообщает, сколько строк вставлено на самом
+        # деле, поэтому вставленные считаются по таблице.
+        existing = model.objects.count()
+        with stream, keep_pub_date(Post, Comment):
+            records = read_records(stream, fmt)
+            while True:
+                try:
+                    batch = list(islice(records, options['batch_size']))
+                except ValueError as error:
+                    raise CommandError(error)
+                if not batch:
+                    break
+                objects = build(batch)
+                with transaction.atomic():
+                    model.objects.bulk_create(objects, ignore_conflicts=True)
+                total += len(objects)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Обработано записей: {total}')
+        self.reset_sequences()
+        elapsed = time.monotonic() - started
+        inserted = model.objects.count() - existing
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {inserted}, пропущено: {self.skipped}, '
+            f'уже были в базе: {total - inserted} за {elapsed:.1f} с '
+            f'({inserted / max(elapsed, 1e-6):.0f} в секунду)'
+        ))
+        if not options['no_rebuild']:
+            self.rebuild()
+
+    def skip(self, record, reason):
+        self.skipped += 1
+        if self.verbosity > 0:
+            self.stderr.write(f'Пропущена запись {record}: {reason}')
+
+    def resolve_users(self, record, *fields):
+        """id пользователей из полей записи или None, если кого-то нет."""
+        user_ids = [self.users.get(record.get(field) or '')
+                    for field in fields]
+        for field, user_id in zip(fields, user_ids):
+            if user_id is None:
+                self.skip(record, f'нет пользователя {record.get(field)!r}')
+                return None
+        return user_ids
+
+    @contextmanager
+    def line(self, number):
+        """Неверное значение в записи - ошибка команды с номером строки."""
+        try:
+            yield
+        except (TypeError, ValueError) as error:
+            raise CommandError(f'Строка {number}: {error}') from error
+
+    def integer(self, record, field):
+        value = record.get(field)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{field}: ожидается число, а не {value!r}')
+
+    def text(self, record):
+        value = record.get('text')
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'text: ожидается непустой текст, а не {value!r}')
+        return value
+
+    def pub_date(self, record):
+        value = record.get('pub_date')
+        if not value:
+            return timezone.now()
+        # parse_datetime возвращает None для строк не того вида
+        # и поднимает ValueError для невозможных дат.
+        try:
+            pub_date = parse_datetime(value)
+        except ValueError:
+            pub_date = None
+        if pub_date is None:
+            raise ValueError(f'pub_date: неверная дата {value!r}')
+        return pub_date
+
+    def image(self, value):
+        """Имя картинки в хранилище.
+
+        Существующий файл копируется в хранилище, иначе значение
+        считается уже готовым именем в MEDIA_ROOT.
+        """
+        if not value:
+            return ''
+        path = os.path.join(self.images_dir, value)
+        if not os.path.isfile(path):
+            return value
+        with open(path, 'rb') as image:
+            return default_storage.save(
+                f'posts/{os.path.basename(path)}', File(image)
+            )
+
+    def build_posts(self, batch):
+        posts = []
+        for number, record in batch:
+            user_ids = self.resolve_users(record, 'author')
+            if user_ids is None:
+                continue
+            author_id, = user_ids
+            group_id = None
+            if record.get('group'):
+                group_id = self.groups.get(record['group'])
+                if group_id is None:
+                    self.skip(record, f'нет группы {record["group"]!r}')
+                    continue
+            with self.line(number):
+                post = Post(
+                    id=self.integer(record, 'id'),
+                    author_id=author_id,
+                    group_id=group_id,
+                    text=self.text(record),
+                    pub_date=self.pub_date(record),
+                )
+            post.image = self.image(record.get('image'))
+            if group_id:
+                self.scopes.add(caching.group_scope(group_id))
+            self.scopes.add(caching.author_scope(author_id))
+            posts.append(post)
+        return posts
+
+    def build_comments(self, batch):
+        post_ids = {}
+        for number, record in batch:
+            with self.line(number):
+                post_ids[number] = self.integer(record, 'post')
+        # Одна проверка существования постов на пачку.
+        existing = set(Post.objects.filter(
+            pk__in=set(post_ids.values()) - {None}
+        ).values_list('pk', flat=True))
+        comments = []
+        for number, record in batch:
+            user_ids = self.resolve_users(record, 'author')
+            if user_ids is None:
+                continue
+            author_id, = user_ids
+            post_id = post_ids[number]
+            if post_id not in existing:
+                self.skip(record, f'нет поста {post_id}')
+                continue
+            with self.line(number):
+                comment = Comment(
+                    id=self.integer(record, 'id'),
+                    post_id=post_id,
+                    author_id=author_id,
+                    text=self.text(record),
+                    pub_date=self.pub_date(record),
+                )
+            self.scopes.add(caching.post_scope(post_id))
+            comments.append(comment)
+        return comments
+
+    def build_follows(self, batch):
+        follows = []
+        for _, record in batch:
+            user_ids = self.resolve_users(record, 'user', 'author')
+            if user_ids is None:
+                continue
+            user_id, author_id = user_ids
+            if user_id == author_id:
+                self.skip(record, 'подписка на самого себя')
+                continue
+            self.scopes.add(caching.follows_scope(user_id))
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        return follows
+
+    def reset_sequences(self):
+        # Явные id не двигают последовательности PostgreSQL.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def rebuild(self):
+        """Обновляет то, что сигналы не видят при bulk_create."""
+        started = time.monotonic()
+        rebuild_counters()
+        if self.kind in ('posts', 'follows'):
+            timeline.rebuild()
+        if self.kind == 'posts':
+            search.rebuild()
+            self.scopes.add(caching.ALL_POSTS)
+        caching.bump(*self.scopes)
+        self.stdout.write(
+            f'Счётчики, ленты и индекс обновлены за '
+            f'{time.monotonic() - started:.1f} с'
+        )
+        if self.kind == 'posts':
+            self.stdout.write(
+                'Миниатюры картинок строит команда build_thumbnails.'
+            )
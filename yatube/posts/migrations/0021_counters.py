@@ -0,0 +1,88 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:01
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    # Копия posts.counters.rebuild_counters на момент миграции:
+    # миграция не должна зависеть от того, как изменится код приложения.
+    db = schema_editor.connection.alias
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post.objects.using(db).update(comment_count=count_of(Comment, 'post'))
+    users = User.objects.using(db).annotate(
+        post_total=count_of(Post, 'author'),
+        follower_total=count_of(Follow, 'author'),
+        following_total=count_of(Follow, 'user'),
+    ).values_list(
+        'pk', 'post_total', 'follower_total', 'following_total'
+    ).iterator(chunk_size=BATCH_SIZE)
+    stats = (
+        UserStats(
+            user_id=pk,
+            post_count=posts,
+            follower_count=followers,
+            following_count=following,
+        )
+        for pk, posts, followers, following in users
+    )
+    while True:
+        batch = list(islice(stats, BATCH_SIZE))
+        if not batch:
+            break
+        UserStats.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0020_follow_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('post_count', models.PositiveIntegerField(default=0, help_text='Количество постов пользователя', verbose_name='Постов')),
+                ('follower_count', models.PositiveIntegerField(default=0, help_text='Количество подписчиков пользователя', verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, help_text='Количество авторов, на которых подписан пользователь', verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Количество комментариев к посту', verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
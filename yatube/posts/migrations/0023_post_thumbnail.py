@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, help_text='Готовая миниатюра картинки для лент', upload_to='cache/thumbnails/', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,130 @@
+import re
+
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+BATCH_SIZE = 1000
+
+# Выражение индекса совпадает с SearchVector('text', config='russian').
+POSTGRES_INDEX = (
+    "CREATE INDEX posts_post_text_search ON posts_post USING GIN "
+    "(to_tsvector('russian'::regconfig, COALESCE(text, '')))"
+)
+
+# Стеммер Портера для русского языка - копия posts.search на момент
+# миграции: индекс заполняется основами слов, и миграция не должна
+# меняться вместе с кодом приложения.
+# RV - часть слова после первой гласной.
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|'
+    r'йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+WORD = re.compile(r'\w+')
+
+
+def _strip(pattern, word, start):
+    """Отрезает окончание pattern, если оно целиком лежит в области RV.
+
+    Поиск идёт по всему слову, чтобы условия вида (?<=[ая]) видели
+    букву перед областью RV.
+    """
+    match = pattern.search(word, start)
+    return word if match is None else word[:match.start()]
+
+
+def stem(word):
+    """Основа русского слова, остальные слова возвращаются как есть."""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start = match.end(1)
+    temp = _strip(PERFECTIVE_GERUND, word, start)
+    if temp == word:
+        word = _strip(REFLEXIVE, word, start)
+        temp = _strip(ADJECTIVE, word, start)
+        if temp != word:
+            word = _strip(PARTICIPLE, temp, start)
+        else:
+            temp = _strip(VERB, word, start)
+            word = _strip(NOUN, word, start) if temp == word else temp
+    else:
+        word = temp
+    if word.endswith('и') and len(word) > start:
+        word = word[:-1]
+    if DERIVATIONAL.match(word[start:]):
+        word = _strip(DERIVATIONAL_SUFFIX, word, start)
+    if word.endswith('ь') and len(word) > start:
+        word = word[:-1]
+    else:
+        word = _strip(SUPERLATIVE, word, start)
+        if word.endswith('нн') and len(word) > start + 1:
+            word = word[:-1]
+    return word
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def fill_index(apps, connection):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.using(connection.alias).values_list('pk', 'text')
+    insert = f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)'
+    with connection.cursor() as cursor:
+        batch = []
+        for pk, text in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append((pk, ' '.join(stems(text))))
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(body)'
+        )
+        fill_index(apps, schema_editor.connection)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX posts_post_text_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,3 +1,5 @@
+import json
+
 from core.models import PubDateModel
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -34,15 +36,69 @@ class Post(PubDateModel):
         blank=True,
         null=True,
     )
+    thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='cache/thumbnails/',
+        blank=True,
+        editable=False,
+        help_text='Готовая миниатюра картинки для лент',
+    )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON: форматы и ширины готовых вариантов картинки',
+    )
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+        help_text='Количество комментариев к посту',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        # Индексы под каждую выборку лент из posts/views.py.
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date'),
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_id_idx',
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:LIMIT_STR]
 
+    @property
+    def image_sources(self):
+        """Источники <picture>: [{'type': MIME, 'srcset': ...}, ...]."""
+        try:
+            variants = json.loads(self.image_variants)
+        except ValueError:
+            return []
+        if not isinstance(variants, dict):
+            return []
+        storage = self.thumbnail.storage
+        return [
+            {
+                'type': mime,
+                'srcset': ', '.join(
+                    f'{storage.url(name)} {width}w' for width, name in sizes
+                ),
+            }
+            for mime, sizes in variants.items()
+        ]
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -91,6 +147,12 @@ class Comment(PubDateModel):
     )
 
     class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'pub_date'),
+                name='comment_post_pub_date_idx',
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -114,5 +176,105 @@ class Follow(models.Model):
     )
 
     class Meta:
+        constraints = (
+            # Уникальный индекс (user, author) заодно обслуживает
+            # выборки подписок пользователя.
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow',
+            ),
+        )
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Обновляются сигналами из posts/signals.py, пересчитываются
+    командой manage.py rebuild_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+        help_text='Пользователь',
+    )
+    post_count = models.PositiveIntegerField(
+        'Постов',
+        default=0,
+        help_text='Количество постов пользователя',
+    )
+    follower_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        help_text='Количество подписчиков пользователя',
+    )
+    following_count = models.PositiveIntegerField(
+        'Подписок',
+        default=0,
+        help_text='Количество авторов, на которых подписан пользователь',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя; для пользователя без записи - нулевые."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок пользователя (fan-out-on-write).
+
+    Заполняется в posts/timeline.py при публикации поста и при подписке.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        help_text='Пользователь, в ленту которого попал пост',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        help_text='Пост в ленте',
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+        help_text='Дата публикации поста',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='timeline_user_pub_date_idx',
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
@@ -0,0 +1,262 @@
+import json
+import re
+
+from django.apps import apps as global_apps
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .addons import BACKWARD, FORWARD, CursorPage, CursorPaginator
+
+# Таблица FTS5 с основами слов постов, rowid совпадает с id поста.
+FTS_TABLE: str = 'posts_post_fts'
+BATCH_SIZE: int = 1000
+
+# Стеммер Портера для русского языка.
+# RV - часть слова после первой гласной.
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|'
+    r'йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+WORD = re.compile(r'\w+')
+
+
+def _strip(pattern, word, start):
+    """Отрезает окончание pattern, если оно целиком лежит в области RV.
+
+    Поиск идёт по всему слову, чтобы условия вида (?<=[ая]) видели
+    букву перед областью RV.
+    """
+    match = pattern.search(word, start)
+    return word if match is None else word[:match.start()]
+
+
+def stem(word):
+    """Основа русского слова, остальные слова возвращаются как есть."""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start = match.end(1)
+    temp = _strip(PERFECTIVE_GERUND, word, start)
+    if temp == word:
+        word = _strip(REFLEXIVE, word, start)
+        temp = _strip(ADJECTIVE, word, start)
+        if temp != word:
+            word = _strip(PARTICIPLE, temp, start)
+        else:
+            temp = _strip(VERB, word, start)
+            word = _strip(NOUN, word, start) if temp == word else temp
+    else:
+        word = temp
+    if word.endswith('и') and len(word) > start:
+        word = word[:-1]
+    if DERIVATIONAL.match(word[start:]):
+        word = _strip(DERIVATIONAL_SUFFIX, word, start)
+    if word.endswith('ь') and len(word) > start:
+        word = word[:-1]
+    else:
+        word = _strip(SUPERLATIVE, word, start)
+        if word.endswith('нн') and len(word) > start + 1:
+            word = word[:-1]
+    return word
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов запроса, каждая как префикс."""
+    return ' AND '.join(f'"{word}"*' for word in stems(query))
+
+
+def _uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    """Обновляет пост в поисковом индексе SQLite.
+
+    В PostgreSQL индекс GIN по to_tsvector обновляется самой базой.
+    """
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+            [post.pk, ' '.join(stems(post.text))],
+        )
+
+
+def remove_post(post_id):
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild(apps=global_apps, db=None):
+    """Заполняет поисковый индекс SQLite заново по всем постам."""
+    db = db or connection
+    if db.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.using(db.alias).values_list('pk', 'text')
+    with db.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        for pk, text in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append((pk, ' '.join(stems(text))))
+            if len(batch) == BATCH_SIZE:
+                _insert(cursor, batch)
+                batch = []
+        if batch:
+            _insert(cursor, batch)
+
+
+def _insert(cursor, rows):
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)', rows
+    )
+
+
+def _ranked_fts(query, position, limit):
+    """Пары (id, оценка) из FTS5, bm25 меньше у лучших совпадений."""
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s'
+    )
+    params = [match_expression(query)]
+    order = 'ASC'
+    if position is not None:
+        direction, score, pk = position
+        operator = '>' if direction == FORWARD else '<'
+        order = 'ASC' if direction == FORWARD else 'DESC'
+        sql += f' AND (bm25({FTS_TABLE}), rowid) {operator} (%s, %s)'
+        params += [score, pk]
+    sql += f' ORDER BY score {order}, rowid {order} LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def _ranked_orm(query, position, limit):
+    """Пары (id, оценка) через ORM: PostgreSQL или поиск по вхождению."""
+    from .models import Post
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVector)
+
+        # Выражение совпадает с индексом posts_post_text_search.
+        vector = SearchVector('text', config='russian')
+        search_query = SearchQuery(query, config='russian')
+        posts = Post.objects.annotate(search=vector).filter(
+            search=search_query
+        ).annotate(score=-SearchRank(vector, search_query))
+    else:
+        posts = Post.objects.filter(text__icontains=query).annotate(
+            score=Value(0.0, output_field=FloatField())
+        )
+    ordering = ('score', 'pk')
+    if position is not None:
+        direction, score, pk = position
+        if direction == FORWARD:
+            posts = posts.filter(
+                Q(score__gt=score) | Q(score=score, pk__gt=pk)
+            )
+        else:
+            posts = posts.filter(
+                Q(score__lt=score) | Q(score=score, pk__lt=pk)
+            )
+            ordering = ('-score', '-pk')
+    return list(posts.order_by(*ordering).values_list('pk', 'score')[:limit])
+
+
+def filter_posts(posts, query):
+    """Оставляет в выборке постов только совпавшие с запросом."""
+    if not stems(query):
+        return posts
+    if _uses_fts():
+        return posts.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match_expression(query)],
+        ))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        return posts.annotate(
+            search=SearchVector('text', config='russian')
+        ).filter(search=SearchQuery(query, config='russian'))
+    return posts.filter(text__icontains=query)
+
+
+class SearchPaginator(CursorPaginator):
+    """Keyset-пагинация результатов поиска по паре (оценка, id).
+
+    object_list - строка запроса, посты выбираются по рангу совпадения.
+    """
+
+    def encode_cursor(self, direction, obj):
+        value = json.dumps([direction, obj.search_score, obj.pk])
+        return urlsafe_base64_encode(value.encode())
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, score, pk = json.loads(
+                urlsafe_base64_decode(cursor).decode()
+            )
+            score = float(score)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if direction not in (FORWARD, BACKWARD):
+            return None
+        return direction, score, pk
+
+    def get_page(self, cursor):
+        from .models import Post
+
+        position = self.decode_cursor(cursor) if cursor else None
+        if not stems(self.object_list):
+            return CursorPage([], self, cursor, False, False)
+        ranked = _ranked_fts if _uses_fts() else _ranked_orm
+        rows = ranked(self.object_list, position, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if position is not None and position[0] == BACKWARD:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in rows]
+        )
+        page = []
+        for pk, score in rows:
+            # Запись индекса могла пережить пост.
+            if pk in posts:
+                posts[pk].search_score = score
+                page.append(posts[pk])
+        return CursorPage(page, self, cursor, has_next, has_previous)
@@ -0,0 +1,101 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, search, thumbnails, timeline
+from .counters import change_comment_count, change_user_stats
+from .models import Comment, Follow, Group, Post, User
+
+# Поля, из которых складывается имя пользователя на страницах.
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def post_moved(sender, instance, **kwargs):
+    # При смене группы устаревает и лента прежней группы.
+    if instance.pk is None:
+        return
+    old_group_id = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', flat=True
+    ).first()
+    if old_group_id and old_group_id != instance.group_id:
+        caching.bump(caching.group_scope(old_group_id))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    caching.bump(
+        *caching.post_scopes(instance), caching.post_scope(instance.pk)
+    )
+    search.index_post(instance)
+    if thumbnails.is_stale(instance):
+        thumbnails.schedule(instance)
+    if created:
+        change_user_stats(instance.author_id, 'post_count', 1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.bump(*caching.post_scopes(instance))
+    change_user_stats(instance.author_id, 'post_count', -1)
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    caching.bump(caching.post_scope(instance.post_id))
+    if created:
+        change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    caching.bump(caching.post_scope(instance.post_id))
+    change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    caching.bump(caching.group_scope(instance.pk))
+
+
+@receiver(pre_save, sender=User)
+def user_renamed(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login, имя при этом не меняется.
+    instance._renamed = False
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        USER_NAME_FIELDS
+    ):
+        return
+    old_names = User.objects.filter(pk=instance.pk).values_list(
+        *USER_NAME_FIELDS
+    ).first()
+    instance._renamed = old_names is not None and old_names != tuple(
+        getattr(instance, field) for field in USER_NAME_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    if getattr(instance, '_renamed', False):
+        caching.bump(*caching.author_scopes(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    caching.bump(caching.follows_scope(instance.user_id))
+    if created:
+        change_user_stats(instance.user_id, 'following_count', 1)
+        change_user_stats(instance.author_id, 'follower_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    caching.bump(caching.follows_scope(instance.user_id))
+    change_user_stats(instance.user_id, 'following_count', -1)
+    change_user_stats(instance.author_id, 'follower_count', -1)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    timeline.follower_left(instance.author_id)
@@ -0,0 +1,81 @@
+# posts/tests/test_admin.py
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..addons import EXACT_COUNT_LIMIT, estimated_count
+from ..models import Group, Post
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class PostAdminTest(QueryBudgetMixin, TestCase):
+    """Проверка списка постов в админке."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        for number in range(20):
+            author = User.objects.create(username=f'author{number}')
+            group = Group.objects.create(
+                title=f'Группа {number}', slug=f'group{number}'
+            )
+            Post.objects.create(
+                author=author, group=group, text=f'Кошка номер {number}'
+            )
+        cls.dog = Post.objects.create(author=author, text='Собака лает')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def test_changelist_has_no_per_row_queries(self):
+        response = self.assertMaxQueries(8, self.url)
+        self.assertEqual(len(response.context['cl'].result_list), 21)
+
+    def test_group_is_editable_in_list(self):
+        response = self.client.get(self.url)
+        formset = response.context['cl'].formset
+        self.assertEqual(len(formset.forms), 21)
+        post = Post.objects.get(text='Кошка номер 0')
+        # В строке только пустой вариант и текущая группа, остальные
+        # подгружает автодополнение.
+        row = next(form for form in formset.forms if form.instance == post)
+        widget = str(row['group'])
+        self.assertIn('admin-autocomplete', widget)
+        self.assertEqual(widget.count('<option'), 2)
+        self.assertIn(str(post.group), widget)
+        group = Group.objects.get(slug='group1')
+        data = {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '1',
+            'form-0-id': str(post.pk),
+            'form-0-group': str(group.pk),
+            '_save': 'Сохранить',
+        }
+        self.client.post(self.url, data)
+        post.refresh_from_db()
+        self.assertEqual(post.group, group)
+
+    def test_search_uses_full_text_index(self):
+        response = self.client.get(self.url, {'q': 'собаки'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.dog])
+
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_count(Post), Post.objects.count())
+        with mock.patch(
+            'posts.addons.estimated_count',
+            return_value=EXACT_COUNT_LIMIT + 1,
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response.context['cl'].result_count, EXACT_COUNT_LIMIT + 1
+        )
@@ -0,0 +1,151 @@
+# posts/tests/test_commands.py
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportExportTest(TestCase):
+    """Проверка выгрузки и загрузки постов, комментариев и подписок."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_group'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Кошки спят'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.folder = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def call(self, name, *args, **options):
+        call_command(name, *args, stdout=StringIO(), stderr=StringIO(),
+                     **options)
+
+    def test_round_trip(self):
+        for kind, name in (('posts', 'posts.ndjson'),
+                           ('comments', 'comments.csv'),
+                           ('follows', 'follows.ndjson')):
+            self.call('export_posts', self.path(name), kind=kind)
+        pub_date = self.post.pub_date
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        for kind, name in (('posts', 'posts.ndjson'),
+                           ('comments', 'comments.csv'),
+                           ('follows', 'follows.ndjson')):
+            self.call('import_posts', self.path(name), kind=kind)
+        post = Post.objects.get()
+        self.assertEqual(
+            (post.pk, post.author, post.group, post.text, post.pub_date),
+            (self.post.pk, self.author, self.group, self.post.text, pub_date)
+        )
+        self.assertEqual(post.comments.get().author, self.reader)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+        # Счётчики, лента, поиск и кэш обновлены после загрузки.
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(UserStats.for_user(self.author).post_count, 1)
+        self.assertEqual(self.reader.timeline.get().post, post)
+        response = self.client.get(reverse('posts:search'), {'q': 'кошка'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Кошки спят')
+
+    def test_import_skips_unknown_and_copies_images(self):
+        with open(self.path('small.gif'), 'wb') as image:
+            image.write(SMALL_GIF)
+        with open(self.path('import.csv'), 'w', encoding='utf-8') as data:
+            data.write(
+                'author,group,text,pub_date,image\n'
+                'author,test_group,С картинкой,2020-01-01T00:00:00+00:00,'
+                'small.gif\n'
+                'nobody,,Чужой пост,,\n'
+                'author,nogroup,Пост без группы,,\n'
+            )
+        stdout = StringIO()
+        call_command(
+            'import_posts', self.path('import.csv'), batch_size=1,
+            images_dir=self.folder, stdout=stdout, stderr=StringIO(),
+        )
+        self.assertIn('Загружено записей: 1, пропущено: 2', stdout.getvalue())
+        post = Post.objects.get(text='С картинкой')
+        self.assertEqual(
+            post.pub_date, datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(post.image.name, 'posts/small.gif')
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_import_reports_bad_values_with_line(self):
+        for kind, content, message in (
+            ('posts', 'author,text,pub_date\n'
+                      'author,Пост,2020-01-01T00:00:00+00:00\n'
+                      'author,Пост,2020-13-45T00:00:00+00:00\n',
+             'Строка 3: pub_date'),
+            ('comments', 'post,author,text\n'
+                         'один,reader,Комментарий\n',
+             'Строка 2: post'),
+        ):
+            with self.subTest(kind=kind):
+                with open(self.path('bad.csv'), 'w', encoding='utf-8') as data:
+                    data.write(content)
+                with self.assertRaisesMessage(CommandError, message):
+                    self.call('import_posts', self.path('bad.csv'), kind=kind)
+        with open(self.path('bad.ndjson'), 'w', encoding='utf-8') as data:
+            data.write('{"author": "author", "text": "Пост"}\n{oops\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2:'):
+            self.call('import_posts', self.path('bad.ndjson'))
+        with open(self.path('bad.ndjson'), 'w', encoding='utf-8') as data:
+            data.write('{"author": "author", "text": null}\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 1: text'):
+            self.call('import_posts', self.path('bad.ndjson'))
+
+    def test_import_counts_only_inserted_rows(self):
+        self.call('export_posts', self.path('posts.ndjson'))
+        stdout = StringIO()
+        call_command(
+            'import_posts', self.path('posts.ndjson'), no_rebuild=True,
+            stdout=stdout, stderr=StringIO(),
+        )
+        self.assertIn(
+            'Загружено записей: 0, пропущено: 0, уже были в базе: 1',
+            stdout.getvalue()
+        )
@@ -1,14 +1,24 @@
 # posts/tests/tests_forms.py
+import os
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import skipUnless
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 from posts.models import Comment, Group, Post
+from posts.uploads import normalize_upload
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 User = get_user_model()
 
@@ -133,3 +143,164 @@ class PostsCreateFormTests(TestCase):
         self.assertEqual(latest.pk, comments_count + 1)
         self.assertEqual(latest.text, form_data['text'])
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+def jpeg_upload(size, name='photo.jpg', exif=None):
+    """Синтетическая фотография: градиент нужного размера в JPEG."""
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90, exif=exif or b'')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def png_upload(size, mode, name='drawing.png'):
+    """Синтетическая картинка PNG в режиме mode (P, 1, I;16...)."""
+    image = Image.linear_gradient('L').resize(size).convert(mode)
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+def peak_memory_growth(func, *args):
+    """Прирост пикового RSS в байтах при вызове func в дочернем процессе.
+
+    Pillow выделяет память под пиксели мимо tracemalloc, поэтому
+    замер идёт по ru_maxrss отдельного процесса.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            func(*args)
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write_fd, str(after - before).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as result:
+        return int(result.read()) * 1024
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=1280)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_large_image_is_downsampled_without_exif(self):
+        """Большая картинка уменьшается, EXIF из неё удаляется."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Test camera'
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с фотографией',
+                'image': jpeg_upload((3000, 2000), exif=exif.tobytes()),
+            },
+        )
+        post = Post.objects.get(author=self.user)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (1280, 853))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними точками отклоняется до декодирования."""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': jpeg_upload((200, 200))},
+        )
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: 200×200 точек.'
+        )
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    def test_large_palette_and_bilevel_png(self):
+        """Картинки в режимах без Image.reduce тоже уменьшаются."""
+        for mode in ('P', '1', 'I;16'):
+            with self.subTest(mode=mode):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={
+                        'text': mode,
+                        'image': png_upload((4000, 2000), mode),
+                    },
+                )
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+                post = Post.objects.get(author=self.user, text=mode)
+                with Image.open(post.image.path) as image:
+                    self.assertEqual(image.size, (1280, 640))
+
+    @override_settings(POST_IMAGE_MAX_DECODED_PIXELS=100 * 100)
+    def test_non_jpeg_decode_limit(self):
+        """PNG декодируется целиком, поэтому предел для него ниже."""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': png_upload((200, 200), 'P')},
+        )
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: 200×200 точек.'
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': jpeg_upload((200, 200))},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_read_only_format_saved_as_png(self):
+        """XPM Pillow читает, но не пишет: картинка сохраняется в PNG."""
+        xpm = SimpleUploadedFile(
+            name='icon.xpm',
+            content=(
+                b'/* XPM */\nstatic char *icon[] = {\n"2 2 2 1",\n'
+                b'"  c #000000",\n". c #FFFFFF",\n" .",\n". "\n};\n'
+            ),
+            content_type='image/x-xpixmap',
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Иконка', 'image': xpm},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        post = Post.objects.get(author=self.user, text='Иконка')
+        self.assertTrue(post.image.name.endswith('.png'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (2, 2)))
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_large_file_rejected(self):
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': jpeg_upload((200, 200))},
+        )
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
+
+    @skipUnless(resource and hasattr(os, 'fork'), 'нужны fork и resource')
+    def test_downsampling_memory(self):
+        """40-мегапиксельный JPEG не декодируется в полном размере."""
+        upload = jpeg_upload((8000, 5000))
+
+        def decode_fully():
+            upload.seek(0)
+            Image.open(upload).load()
+
+        full = peak_memory_growth(decode_fully)
+        normalized = peak_memory_growth(normalize_upload, upload)
+        # Полная картинка занимает в Pillow 8000 * 5000 * 4 байт.
+        self.assertGreater(full, 100 * 1024 * 1024)
+        self.assertLess(normalized, full / 4)
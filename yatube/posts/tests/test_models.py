@@ -1,7 +1,12 @@
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 # Limit for __str__ method Post text field
@@ -94,3 +99,115 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     group._meta.get_field(field).verbose_name, expected_value)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class FeedIndexesTest(TestCase):
+    """Проверяем, что выборки лент используют составные индексы."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_feed_queries_use_indexes(self):
+        queries = {
+            'post_pub_date_id_idx': Post.objects.order_by('-pub_date', '-id'),
+            'post_author_pub_date_idx': Post.objects.filter(author=self.user),
+            'post_group_pub_date_idx': self.group.posts.all(),
+            'comment_post_pub_date_idx': Comment.objects.filter(
+                post=self.post
+            ).order_by('pub_date'),
+            # Индекс ограничения unique_follow создаётся SQLite неявно.
+            'sqlite_autoindex_posts_follow': Follow.objects.filter(
+                user=self.user, author=self.user
+            ),
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                plan = self.query_plan(queryset)
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FollowConstraintsTest(TestCase):
+    """Проверяем ограничения целостности модели Follow."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_self_follow_is_forbidden(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user)
+
+
+class CountersTest(TestCase):
+    """Проверяем денормализованные счётчики постов, комментариев, подписок."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(self.author).post_count, 2)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.assertEqual(self.stats(self.author).follower_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_rebuild_counters_command(self):
+        Post.objects.bulk_create(
+            [Post(author=self.author, text=f'Пост {i}') for i in range(3)]
+        )
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=self.user, text='Комментарий')]
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.user, author=self.author)]
+        )
+        call_command('rebuild_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.stats(self.author).post_count, 3)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        self.assertEqual(self.stats(self.user).post_count, 0)
@@ -0,0 +1,130 @@
+# posts/tests/test_queries.py
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .utils import PAGE_SIZES, QueryBudgetMixin, posts_on_page
+
+User = get_user_model()
+
+# Бюджеты запросов страниц. В каждый входят сессия и пользователь,
+# в страницы с ETag - ещё запрос ключа объекта для ETag,
+# в страницы под transaction.atomic - SAVEPOINT и RELEASE.
+BUDGETS = {
+    'index': 4,
+    'group_list': 6,
+    'profile': 6,
+    'post_detail': 5,
+    'post_edit': 4,
+    'post_create': 5,
+    'follow_index': 5,
+}
+
+
+@override_settings(CACHE_SHARED=True)
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов страниц не зависит от числа постов на них."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        # Посты разных авторов и групп, чтобы не было общих объектов.
+        for number in range(max(PAGE_SIZES)):
+            author = User.objects.create(username=f'author{number}')
+            group = Group.objects.create(
+                title=f'Группа {number}', slug=f'group{number}'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                author=author,
+                group=cls.group if number % 2 else group,
+                text=f'Пост {number}',
+            )
+        cls.author = author
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Ещё {number}')
+            for number in range(max(PAGE_SIZES))
+        )
+        # У поста с N комментариями N разных комментаторов.
+        cls.commented = {}
+        for size in PAGE_SIZES:
+            post = Post.objects.create(author=cls.author, text=f'{size}')
+            Comment.objects.bulk_create(
+                Comment(post=post, author=author, text='Комментарий')
+                for author in User.objects.all()[:size]
+            )
+            cls.commented[size] = post
+        # Картинки с готовыми миниатюрами: файлы для ссылок не нужны.
+        Post.objects.update(
+            image='posts/small.gif',
+            thumbnail='cache/thumbnails/small.jpg',
+            image_variants=json.dumps(
+                {'image/webp': [[480, 'cache/thumbnails/small_480w.webp']]}
+            ),
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertPageBudget(self, name, url, size):
+        response = self.assertMaxQueries(
+            BUDGETS[name], url, self.authorized_client
+        )
+        self.assertEqual(response.status_code, 200)
+        if 'page_obj' in response.context:
+            self.assertEqual(len(response.context['page_obj']), size)
+
+    @posts_on_page()
+    def test_feeds(self, size):
+        pages = {
+            'index': reverse('posts:index'),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': self.author}
+            ),
+        }
+        for name, url in pages.items():
+            self.assertPageBudget(name, url, size)
+
+    @posts_on_page()
+    def test_follow_index(self, size):
+        response = self.assertMaxQueries(
+            BUDGETS['follow_index'], reverse('posts:follow_index'),
+            self.reader_client,
+        )
+        self.assertEqual(len(response.context['page_obj']), size)
+
+    @posts_on_page()
+    def test_post_detail(self, size):
+        post = self.commented[size]
+        response = self.assertMaxQueries(
+            BUDGETS['post_detail'],
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            self.authorized_client,
+        )
+        self.assertEqual(len(response.context['comments']), size)
+
+    def test_post_forms(self):
+        post = self.commented[1]
+        self.assertMaxQueries(
+            BUDGETS['post_edit'],
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            self.authorized_client,
+        )
+        self.assertMaxQueries(
+            BUDGETS['post_create'], reverse('posts:post_create'),
+            self.authorized_client,
+        )
@@ -1,16 +1,25 @@
 # posts/tests/test_views.py
 import shutil
 import tempfile
+import threading
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .. import batching, thumbnails, timeline
+from ..checks import check_shared_cache
 from ..forms import PostForm
-from ..models import Follow, Group, Post
+from ..models import Comment, Follow, Group, Post, TimelineEntry
 
 User = get_user_model()
 
@@ -22,6 +31,15 @@ CREATE_POST: int = 20
 # Для title на странице post_detail ограничение в 30 символов.
 TITLE_LENGTH: int = 30
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostsPagesTests(TestCase):
@@ -198,6 +216,54 @@ class PaginatorViewsTest(TestCase):
                 CREATE_POST - settings.POSTS_ON_PAGE
             )
 
+    def test_cursor_pagination_walks_all_posts(self):
+        """Keyset-пагинация проходит ленту вперёд и назад без OFFSET."""
+        check_pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+        )
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        for page in check_pages:
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(page + '?cursor=')
+                self.assertFalse(
+                    any('OFFSET' in q['sql'] for q in queries.captured_queries)
+                )
+                first = response.context['page_obj']
+                self.assertFalse(first.has_previous())
+                self.assertTrue(first.has_next())
+                response = self.client.get(
+                    page + '?cursor=' + first.next_cursor()
+                )
+                second = response.context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in first] + [post.pk for post in second],
+                    expected
+                )
+                self.assertFalse(second.has_next())
+                response = self.client.get(
+                    page + '?cursor=' + second.previous_cursor()
+                )
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']],
+                    [post.pk for post in first]
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=abc')
+        self.assertEqual(
+            len(response.context['page_obj']),
+            settings.POSTS_ON_PAGE
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
 
 class CachingTest(TestCase):
     """Проверка работы кэша на странице index."""
@@ -219,13 +285,49 @@ class CachingTest(TestCase):
     def test_index_page_caching(self):
         """Проверяем работу кэша списка записей на главной странице."""
         response_1 = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.filter(pk=self.post.id).delete()
+        # update() не отправляет сигналы, поэтому кэш не сбрасывается.
+        Post.objects.filter(pk=self.post.id).update(text='Новый текст.')
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_1.content, response_3.content)
 
+    def test_feed_caches_are_invalidated_by_posts(self):
+        """Новый и удалённый пост сразу видны во всех кэшируемых лентах."""
+        group = Group.objects.create(
+            title='Группа кэша',
+            slug='cache_group',
+            description='Описание',
+        )
+        check_pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for page in check_pages:
+            self.client.get(page)
+        post = Post.objects.create(
+            author=self.user, text='Свежий пост.', group=group
+        )
+        for page in check_pages:
+            with self.subTest(page=page):
+                self.assertContains(self.client.get(page), post.text)
+        post.delete()
+        for page in check_pages:
+            with self.subTest(page=page):
+                self.assertNotContains(self.client.get(page), post.text)
+
+    def test_shared_cache_check(self):
+        """Без общего кэша проверка --deploy предупреждает о поколениях."""
+        with self.settings(CACHE_SHARED=False):
+            self.assertEqual(
+                [error.id for error in check_shared_cache(None)],
+                ['posts.W001'],
+            )
+        with self.settings(CACHE_SHARED=True):
+            self.assertEqual(check_shared_cache(None), [])
+
 
 class FollowingTest(TestCase):
     """Проверка работы подписок, отписок на страницах авторов."""
@@ -288,6 +390,16 @@ class FollowingTest(TestCase):
             count
         )
 
+    def test_repeated_follow_creates_one_record(self):
+        """Повторная подписка и подписка на себя не создают записей."""
+        url = reverse('posts:profile_follow', kwargs={'username': self.author})
+        self.authorized_client.post(url)
+        self.authorized_client.post(url)
+        self.authorized_client.post(
+            reverse('posts:profile_follow', kwargs={'username': self.user})
+        )
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+
     def test_new_post_on_following_page(self):
         """"Проверяем что пост появляется в избранной ленте после
         подписки у пользователя, а не у подписанного нет."""
@@ -300,3 +412,395 @@ class FollowingTest(TestCase):
         self.assertEqual(post_text, self.post_author.text)
         response = self.authorized_client_two.get('/follow/')
         self.assertNotContains(response, self.post_author.text)
+
+    def test_timeline_follows_subscriptions(self):
+        """Посты автора попадают в ленту подписчика и уходят после отписки."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            set(self.user.timeline.values_list('post', flat=True)),
+            {self.post_author.pk, new_post.pk}
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertFalse(self.user.timeline.exists())
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_capped(self):
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Последний пост')
+        self.assertEqual(self.user.timeline.count(), 2)
+        self.assertEqual(
+            self.user.timeline.first().post.text, 'Последний пост'
+        )
+
+    @override_settings(TIMELINE_LENGTH=10, TIMELINE_PRUNE_SLACK=0.2)
+    def test_timeline_is_pruned_after_slack(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(11)
+        ]
+        # 12 записей вместе с постом до подписки: в пределах 10 + 20%.
+        self.assertEqual(self.user.timeline.count(), 12)
+        posts.append(Post.objects.create(author=self.author, text='Ещё'))
+        self.assertEqual(
+            list(self.user.timeline.values_list('post', flat=True)),
+            [post.pk for post in reversed(posts[-10:])]
+        )
+
+    @override_settings(TIMELINE_LENGTH=2, TIMELINE_PRUNE_SLACK=0)
+    def test_prune_touches_only_overflowing_timelines(self):
+        for i in range(2):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.create(
+            user=self.user, post=self.post, pub_date=self.post.pub_date
+        )
+        TimelineEntry.objects.create(
+            user=self.user_two, post=self.post, pub_date=self.post.pub_date
+        )
+        # Поиск переполненных лент, затем граница и DELETE для каждой.
+        with self.assertNumQueries(3):
+            timeline.prune([self.user.pk, self.user_two.pk])
+        self.assertEqual(self.user.timeline.count(), 2)
+        self.assertEqual(self.user_two.timeline.count(), 1)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты автора с большим числом подписчиков читаются напрямую."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Пост знаменитости')
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'][0].text, 'Пост знаменитости'
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_demoted_author_is_backfilled(self):
+        """Посты бывшей знаменитости попадают в ленты подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user_two, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(new_post.timeline_entries.exists())
+        Follow.objects.filter(user=self.user_two).delete()
+        self.assertEqual(
+            list(new_post.timeline_entries.values_list('user', flat=True)),
+            [self.user.pk]
+        )
+
+    @override_settings(POSTS_PAGINATION='cursor', POSTS_ON_PAGE=1)
+    def test_timeline_cursor_pages(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        url = reverse('posts:follow_index')
+        page = self.authorized_client.get(url).context['page_obj']
+        self.assertEqual(list(page), [new_post])
+        page = self.authorized_client.get(
+            url, {'cursor': page.next_cursor()}
+        ).context['page_obj']
+        self.assertEqual(list(page), [self.post_author])
+        self.assertFalse(page.has_next())
+
+
+@override_settings(CACHE_SHARED=True)
+class ConditionalGetTest(TestCase):
+    """Проверка ответов 304 Not Modified по ETag."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Текст поста.',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        # Переполненный locmem вытесняет счётчики поколений.
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_unchanged_pages_are_not_rendered(self):
+        for client in (self.client, self.authorized_client):
+            for page in self.pages:
+                with self.subTest(page=page):
+                    etag = client.get(page)['ETag']
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(
+                            page, HTTP_IF_NONE_MATCH=etag
+                        )
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response.templates, [])
+                    # Не больше одного запроса ключа страницы и сессии.
+                    self.assertLessEqual(len(queries), 2)
+
+    def test_changes_produce_new_etag(self):
+        etags = [self.client.get(page)['ETag'] for page in self.pages]
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for page, etag in zip(self.pages, etags):
+            with self.subTest(page=page):
+                response = self.client.get(page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        page = reverse('posts:index')
+        self.assertNotEqual(
+            self.client.get(page)['ETag'],
+            self.authorized_client.get(page)['ETag']
+        )
+
+    def test_rename_produces_new_etag(self):
+        etags = [self.client.get(page)['ETag'] for page in self.pages]
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Имя'
+        author.save()
+        for page, etag in zip(self.pages, etags):
+            with self.subTest(page=page):
+                response = self.client.get(page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_commentator_rename_produces_new_etag(self):
+        commentator = User.objects.create_user(username='Commentator')
+        Comment.objects.create(
+            post=self.post, author=commentator, text='Комментарий'
+        )
+        page = self.pages[-1]
+        etag = self.client.get(page)['ETag']
+        commentator.first_name = 'Имя'
+        commentator.save()
+        response = self.client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_keeps_etag(self):
+        author = User.objects.get(pk=self.user.pk)
+        author.set_password('password')
+        author.save()
+        etags = [self.client.get(page)['ETag'] for page in self.pages]
+        # Вход сохраняет last_login, имя автора не меняется.
+        self.assertTrue(
+            self.client.login(username='HasNoName', password='password')
+        )
+        self.client.logout()
+        for page, etag in zip(self.pages, etags):
+            with self.subTest(page=page):
+                response = self.client.get(page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_no_etag_without_shared_cache(self):
+        for page in self.pages:
+            with self.subTest(page=page):
+                self.assertFalse(self.client.get(page).has_header('ETag'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    """Проверка заранее построенных миниатюр картинок постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name=name, content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @override_settings(POST_THUMBNAIL_WORKERS=0)
+    def test_thumbnail_is_built_on_save(self):
+        post = self.create_post()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        self.assertEqual(
+            (post.thumbnail.width, post.thumbnail.height),
+            settings.POST_THUMBNAIL_SIZE
+        )
+        webp = [
+            source for source in post.image_sources
+            if source['type'] == 'image/webp'
+        ]
+        self.assertEqual(len(webp), 1)
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertIn(f'.webp {width}w', webp[0]['srcset'])
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.thumbnail.url)
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertFalse(
+            any('thumbnail_kvstore' in q['sql']
+                for q in queries.captured_queries)
+        )
+
+    @override_settings(POST_THUMBNAIL_WORKERS=0)
+    def test_old_variants_are_deleted(self):
+        post = self.create_post()
+        post.refresh_from_db()
+        old_files = thumbnails.stored_files(post)
+        storage = post.thumbnail.storage
+        self.assertTrue(all(storage.exists(name) for name in old_files))
+        post.image = SimpleUploadedFile(
+            name='other.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        post.save()
+        post.refresh_from_db()
+        new_files = thumbnails.stored_files(post)
+        self.assertFalse(old_files & new_files)
+        self.assertFalse(any(storage.exists(name) for name in old_files))
+        post.image = None
+        post.save()
+        self.assertFalse(any(storage.exists(name) for name in new_files))
+
+    @override_settings(POST_THUMBNAIL_WORKERS=0)
+    def test_same_name_with_other_extension_is_kept(self):
+        first = self.create_post(name='photo.gif')
+        second = self.create_post(name='photo.png')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        second_files = thumbnails.stored_files(second)
+        self.assertFalse(thumbnails.stored_files(first) & second_files)
+        first.image = None
+        first.save()
+        storage = second.thumbnail.storage
+        self.assertTrue(all(storage.exists(name) for name in second_files))
+
+    @override_settings(CACHE_SHARED=True)
+    def test_build_thumbnails_command(self):
+        # В TestCase коммита нет, поэтому фоновый пул не запускается.
+        post = self.create_post()
+        post.refresh_from_db()
+        self.assertFalse(post.thumbnail)
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+        etag = response['ETag']
+        call_command('build_thumbnails', jobs=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        # Лента и ETag сбрасываются, хотя post_save не было.
+        response = self.client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertContains(response, post.thumbnail.url)
+
+
+class SearchTest(TestCase):
+    """Проверка полнотекстового поиска по постам."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Кошки гуляют по крышам. Кошка и кошки.'
+        )
+        cls.cat = Post.objects.create(
+            author=cls.user, text='Рыжая кошка спит на диване.'
+        )
+        cls.dog = Post.objects.create(
+            author=cls.user, text='Собака лает на прохожих.'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj'])
+
+    def test_word_forms_are_found_by_rank(self):
+        self.assertEqual(self.search('кошками'), [self.cats, self.cat])
+        self.assertEqual(self.search('собаки лают'), [self.dog])
+        self.assertEqual(self.search('жираф'), [])
+
+    def test_index_follows_changes(self):
+        dog = Post.objects.get(pk=self.dog.pk)
+        dog.text = 'Собака спит на диване.'
+        dog.save()
+        self.assertIn(dog, self.search('диван'))
+        Post.objects.filter(pk=self.cat.pk).delete()
+        self.assertEqual(self.search('диван'), [dog])
+
+    @override_settings(POSTS_ON_PAGE=1)
+    def test_keyset_pagination(self):
+        pages = []
+        cursor = ''
+        while True:
+            response = self.client.get(
+                reverse('posts:search'), {'q': 'кошка', 'cursor': cursor}
+            )
+            page_obj = response.context['page_obj']
+            pages.extend(page_obj)
+            if not page_obj.has_next():
+                break
+            cursor = page_obj.next_cursor()
+        self.assertEqual(pages, [self.cats, self.cat])
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0&')
+        previous = self.search('кошка', cursor=page_obj.previous_cursor())
+        self.assertEqual(previous, [self.cats])
+
+
+@override_settings(QUERY_BATCH_WORKERS=2)
+class QueryBatchingTest(TransactionTestCase):
+    """Профиль и пост с запросами в пуле потоков (posts/batching.py)."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def test_queries_run_in_pool(self):
+        threads = batching.run(
+            lambda: threading.current_thread().name,
+            lambda: threading.current_thread().name,
+        )
+        self.assertEqual(threads[0], threading.current_thread().name)
+        self.assertTrue(threads[1].startswith('queries'))
+
+    def test_profile(self):
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertTrue(response.context['following'])
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        missing = self.client.get(reverse('posts:profile', args=['nobody']))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_post_detail(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertEqual(response.context['post'], self.post)
+        self.assertContains(response, 'Комментарий')
+        missing = self.client.get(reverse('posts:post_detail', args=[0]))
+        self.assertEqual(missing.status_code, 404)
@@ -0,0 +1,48 @@
+# posts/tests/utils.py
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+# Сколько постов выводится на странице при проверке бюджета запросов.
+PAGE_SIZES = (1, 10, 100)
+
+
+def posts_on_page(*sizes):
+    """Запускает тест для каждого размера страницы из sizes.
+
+    Размер передаётся в тест аргументом и подставляется в POSTS_ON_PAGE.
+    """
+    sizes = sizes or PAGE_SIZES
+
+    def decorator(test):
+        @wraps(test)
+        def wrapper(self, *args, **kwargs):
+            for size in sizes:
+                with self.subTest(posts_on_page=size), \
+                        override_settings(POSTS_ON_PAGE=size):
+                    test(self, size, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов, которые делает страница."""
+
+    def assertMaxQueries(self, budget, url, client=None, **extra):
+        """Запрашивает url без кэша и проверяет, что запросов не больше
+        budget. Возвращает ответ."""
+        client = client or self.client
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, **extra)
+        executed = [query['sql'] for query in queries.captured_queries]
+        self.assertLessEqual(
+            len(executed), budget,
+            '%s: %d запросов вместо %d:\n%s' % (
+                url, len(executed), budget, '\n'.join(executed)
+            )
+        )
+        return response
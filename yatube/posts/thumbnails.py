@@ -0,0 +1,222 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from core import profiling
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+try:
+    # AVIF в Pillow до 11.2 поддерживается только этим плагином.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Папка готовых миниатюр в MEDIA_ROOT.
+THUMBNAIL_DIR: str = 'cache/thumbnails'
+JPEG_QUALITY: int = 85
+
+# Современные форматы для <picture>: MIME-тип, формат Pillow,
+# расширение и параметры кодирования. Порядок - от лучшего сжатия.
+MODERN_FORMATS = (
+    ('image/avif', 'AVIF', 'avif', {'quality': 50}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+)
+
+_executor = None
+
+
+def available_formats():
+    """Современные форматы, которые умеет кодировать установленный Pillow."""
+    Image.init()
+    return [fmt for fmt in MODERN_FORMATS if fmt[1] in Image.SAVE]
+
+
+def thumbnail_name(image_name):
+    """Имя миниатюры однозначно следует из имени картинки.
+
+    Расширение картинки остаётся в имени: у photo.jpg и photo.png
+    разные миниатюры.
+    """
+    width, height = settings.POST_THUMBNAIL_SIZE
+    return f'{THUMBNAIL_DIR}/{image_name}_{width}x{height}.jpg'
+
+
+def variant_name(image_name, width, extension):
+    return f'{THUMBNAIL_DIR}/{image_name}_{width}w.{extension}'
+
+
+def is_stale(post):
+    if not post.image:
+        return bool(post.thumbnail)
+    return post.thumbnail.name != thumbnail_name(post.image.name)
+
+
+def fit(image, width):
+    """Обрезает картинку по центру до ширины width в пропорциях ленты."""
+    base_width, base_height = settings.POST_THUMBNAIL_SIZE
+    size = (width, round(width * base_height / base_width))
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+def encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def encode_thumbnail(image):
+    """Миниатюра POST_THUMBNAIL_SIZE в JPEG для браузеров без WebP."""
+    return encode(
+        fit(image, settings.POST_THUMBNAIL_SIZE[0]),
+        'JPEG', quality=JPEG_QUALITY, optimize=True,
+    )
+
+
+def render_variants(image_file):
+    """Миниатюра JPEG и варианты современных форматов разной ширины.
+
+    Возвращает (jpeg-байты, {mime: [(ширина, расширение, байты), ...]}).
+    """
+    with Image.open(image_file) as image:
+        image = image.convert('RGB')
+    thumbnail = encode_thumbnail(image)
+    variants = {}
+    for width in settings.POST_IMAGE_WIDTHS:
+        resized = fit(image, width)
+        for mime, image_format, extension, options in available_formats():
+            variants.setdefault(mime, []).append(
+                (width, extension, encode(resized, image_format, **options))
+            )
+    return thumbnail, variants
+
+
+def _save(storage, name, content):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def stored_files(post):
+    """Имена миниатюры и вариантов, записанных в строку поста."""
+    names = {post.thumbnail.name} if post.thumbnail else set()
+    try:
+        variants = json.loads(post.image_variants)
+    except ValueError:
+        variants = {}
+    if isinstance(variants, dict):
+        for sizes in variants.values():
+            names.update(name for _, name in sizes)
+    return names
+
+
+def _delete(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Не удалось удалить файл %s', name)
+
+
+def _bump(post):
+    # update() не шлёт post_save: закэшированные ленты и ETag со ссылкой
+    # на полноразмерную картинку устаревают здесь.
+    caching.bump(*caching.post_scopes(post), caching.post_scope(post.pk))
+
+
+def build_thumbnail(post_id):
+    """Строит миниатюру и варианты картинки, записывает их в строку поста.
+
+    Файлы прежней картинки удаляются. Возвращает True, если миниатюра
+    построена.
+    """
+    from .models import Post
+
+    try:
+        post = Post.objects.only(
+            'image', 'thumbnail', 'image_variants', 'author', 'group'
+        ).get(pk=post_id)
+    except Post.DoesNotExist:
+        return False
+    storage = post.thumbnail.storage
+    old_files = stored_files(post)
+    if not post.image:
+        if Post.objects.filter(pk=post_id, image='').update(
+            thumbnail='', image_variants=''
+        ):
+            _bump(post)
+            _delete(storage, old_files)
+        return False
+    image_name = post.image.name
+    with profiling.timer('thumbnail'):
+        with post.image.open('rb') as image_file:
+            thumbnail, variants = render_variants(image_file)
+        thumbnail = _save(storage, thumbnail_name(image_name), thumbnail)
+        names = {
+            mime: [
+                (width, _save(
+                    storage, variant_name(image_name, width, extension),
+                    content,
+                ))
+                for width, extension, content in sizes
+            ]
+            for mime, sizes in variants.items()
+        }
+    # Картинку могли заменить, пока строилась миниатюра.
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnail=thumbnail,
+        image_variants=json.dumps(names),
+    )
+    if updated:
+        _bump(post)
+        new_files = {thumbnail}
+        for sizes in names.values():
+            new_files.update(name for _, name in sizes)
+        _delete(storage, old_files - new_files)
+    return True
+
+
+def _build_in_worker(post_id):
+    try:
+        build_thumbnail(post_id)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def schedule(post):
+    """Ставит построение миниатюры в фоновый пул после коммита.
+
+    При POST_THUMBNAIL_WORKERS = 0 миниатюра строится сразу.
+    """
+    if not settings.POST_THUMBNAIL_WORKERS:
+        try:
+            build_thumbnail(post.pk)
+        except Exception:
+            logger.exception(
+                'Не удалось построить миниатюру поста %s', post.pk
+            )
+        return
+    post_id = post.pk
+    transaction.on_commit(
+        lambda: _get_executor().submit(_build_in_worker, post_id)
+    )
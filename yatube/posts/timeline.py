@@ -0,0 +1,176 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import Count, F, Q
+
+# Размер пачки при раздаче поста по лентам подписчиков.
+BATCH_SIZE: int = 1000
+
+
+def _is_celebrity(apps, author_id):
+    """Автор со слишком большим числом подписчиков не раздаётся по лентам,
+    его посты подмешиваются при чтении ленты."""
+    UserStats = apps.get_model('posts', 'UserStats')
+    return UserStats.objects.filter(
+        user_id=author_id,
+        follower_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def prune(user_ids, apps=global_apps):
+    """Обрезает ленты пользователей до TIMELINE_LENGTH записей.
+
+    Сначала одним запросом находятся переполненные ленты, обрезаются
+    только они: коррелированный подзапрос по каждой записи ленты
+    обходился квадратично дорого. Лента обрезается, только когда
+    переполнена больше чем на TIMELINE_PRUNE_SLACK, иначе каждый новый
+    пост популярного автора обрезал бы все полные ленты подписчиков.
+    """
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    limit = settings.TIMELINE_LENGTH
+    slack = int(limit * settings.TIMELINE_PRUNE_SLACK)
+    overflowing = TimelineEntry.objects.filter(
+        user_id__in=user_ids
+    ).order_by().values('user_id').annotate(total=Count('pk')).filter(
+        total__gt=limit + slack
+    ).values_list('user_id', flat=True)
+    for user_id in overflowing:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        oldest_kept = entries.order_by('-pub_date').values_list(
+            'pub_date', flat=True
+        )[limit - 1]
+        entries.filter(pub_date__lt=oldest_kept).delete()
+
+
+def fan_out(post, apps=global_apps):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if _is_celebrity(apps, post.author_id):
+        return
+    Follow = apps.get_model('posts', 'Follow')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for user_id in followers:
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            _fan_out_batch(TimelineEntry, post, batch, apps)
+            batch = []
+    if batch:
+        _fan_out_batch(TimelineEntry, post, batch, apps)
+
+
+def _fan_out_batch(TimelineEntry, post, user_ids, apps):
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          pub_date=post.pub_date)
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+    prune(user_ids, apps)
+
+
+def _latest_posts(apps, author_id):
+    Post = apps.get_model('posts', 'Post')
+    return list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH])
+
+
+def _add_posts(apps, user_ids, posts):
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id in user_ids
+            for pk, pub_date in posts
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    prune(user_ids, apps)
+
+
+def backfill(user_id, author_id, apps=global_apps):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if _is_celebrity(apps, author_id):
+        return
+    _add_posts(apps, [user_id], _latest_posts(apps, author_id))
+
+
+def follower_left(author_id, apps=global_apps):
+    """Раздаёт посты автора подписчикам, если он перестал быть знаменитостью.
+
+    Пока подписчиков было больше TIMELINE_FANOUT_LIMIT, его посты
+    подмешивались при чтении и в ленты не попадали. После отписки,
+    опустившей счётчик ровно до предела, ленты подписчиков дополняются
+    его последними постами пачками по BATCH_SIZE подписчиков.
+    """
+    UserStats = apps.get_model('posts', 'UserStats')
+    demoted = UserStats.objects.filter(
+        user_id=author_id,
+        follower_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+    if not demoted:
+        return
+    posts = _latest_posts(apps, author_id)
+    if not posts:
+        return
+    Follow = apps.get_model('posts', 'Follow')
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for user_id in followers:
+        batch.append(user_id)
+        if len(batch) == BATCH_SIZE:
+            _add_posts(apps, batch, posts)
+            batch = []
+    if batch:
+        _add_posts(apps, batch, posts)
+
+
+def remove_author(user_id, author_id, apps=global_apps):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(apps=global_apps):
+    """Заполняет ленты заново по текущим подпискам."""
+    Follow = apps.get_model('posts', 'Follow')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator(chunk_size=BATCH_SIZE):
+        backfill(user_id, author_id, apps)
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя по убыванию feed_date.
+
+    Обычно это один диапазон по индексу (user, -pub_date) материализованной
+    ленты: feed_date - дата из записи ленты, а не Post.pub_date, иначе
+    сортировка по другой таблице join'а не использует индекс. Посты
+    авторов-знаменитостей подмешиваются при чтении.
+    """
+    from .models import Follow, Post
+
+    posts = Post.objects.select_related('author', 'group')
+    celebrities = Follow.objects.filter(
+        user=user,
+        author__stats__follower_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('author')
+    if not celebrities.exists():
+        posts = posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date')
+        )
+    else:
+        posts = posts.filter(
+            Q(pk__in=user.timeline.values('post')) | Q(author__in=celebrities)
+        ).annotate(feed_date=F('pub_date'))
+    return posts.order_by('-feed_date', '-pk')
@@ -0,0 +1,87 @@
+import csv
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+# Поля выгрузки по видам записей. Посты и комментарии сохраняют id,
+# чтобы комментарии можно было загрузить к тем же постам.
+FIELDS = {
+    'posts': ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'pub_date'),
+    'follows': ('user', 'author'),
+}
+FORMATS = ('ndjson', 'csv')
+
+
+def guess_format(path, default='ndjson'):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension in ('json', 'jsonl'):
+        return 'ndjson'
+    return extension if extension in FORMATS else default
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def write_records(stream, fmt, fields, rows):
+    """Пишет строки rows (кортежи в порядке fields) в поток.
+
+    Возвращает число записанных строк.
+    """
+    written = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([_plain(value) for value in row])
+            written += 1
+        return written
+    for row in rows:
+        record = dict(zip(fields, (_plain(value) for value in row)))
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        written += 1
+    return written
+
+
+def read_records(stream, fmt):
+    """Лениво читает пары (номер строки, запись-словарь) из NDJSON или CSV.
+
+    Номер - строка файла, на которой запись кончается. Испорченная
+    строка поднимает ValueError с её номером.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except csv.Error as error:
+            raise ValueError(f'Строка {reader.line_num}: {error}') from error
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'Строка {number}: {error}') from error
+        if not isinstance(record, dict):
+            raise ValueError(f'Строка {number}: ожидается объект JSON')
+        yield number, record
+
+
+@contextmanager
+def keep_pub_date(*models):
+    """Отключает auto_now_add у pub_date, чтобы сохранить даты из файла."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
@@ -0,0 +1,111 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Режимы, которые умеет Image.reduce; остальные (P, 1, I;16...)
+# перед уменьшением переводятся в RGB, RGBA или L.
+REDUCE_MODES = frozenset(('L', 'LA', 'I', 'F', 'RGB', 'RGBA', 'CMYK'))
+
+# Параметры перекодирования загруженного оригинала по форматам Pillow.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+# Форматы, которые Pillow читает, но не пишет (XPM, PCD...),
+# перекодируются в PNG.
+FALLBACK_FORMAT: str = 'PNG'
+
+
+def check_upload(upload):
+    """Проверяет размер файла и разрешение по заголовку картинки.
+
+    Image.open читает только заголовок, пиксели не декодируются.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл слишком большой: %(size)s, допустимо не больше %(max)s.',
+            code='file_too_large',
+            params={
+                'size': filesizeformat(upload.size),
+                'max': filesizeformat(settings.POST_IMAGE_MAX_BYTES),
+            },
+        )
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        image_format = image.format
+    # Уменьшенным сразу декодируется только JPEG, остальные форматы
+    # декодируются целиком, поэтому для них предел ниже.
+    max_pixels = (settings.POST_IMAGE_MAX_PIXELS if image_format == 'JPEG'
+                  else settings.POST_IMAGE_MAX_DECODED_PIXELS)
+    if width * height > max_pixels:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s точек.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def _shrink(image, side):
+    """Уменьшает картинку так, чтобы длинная сторона была не больше side."""
+    width, height = image.size
+    scale = side / max(width, height)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    # Для JPEG декодер сразу отдаёт картинку в масштабе 1/2, 1/4 или 1/8.
+    image.draft(None, size)
+    if image.mode not in REDUCE_MODES:
+        if image.mode == '1':
+            image = image.convert('L')
+        elif image.mode in ('P', 'PA') or 'A' in image.mode:
+            image = image.convert('RGBA')
+        else:
+            image = image.convert('RGB')
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor > 1:
+        image = image.reduce(factor)
+    return image.resize(size, Image.LANCZOS)
+
+
+def normalize_upload(upload):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE и убирает из неё EXIF.
+
+    JPEG декодируется сразу в уменьшенном масштабе (draft), поэтому
+    полноразмерная копия пикселей в памяти не появляется. Остальные
+    форматы декодируются целиком (их размер ограничен
+    POST_IMAGE_MAX_DECODED_PIXELS в check_upload) и уменьшаются через
+    reduce. Результат пишется во временный файл,
+    который хранилище потом копирует по частям. Картинка в формате,
+    который Pillow не умеет записывать, сохраняется как PNG.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = image.format
+        if getattr(image, 'is_animated', False):
+            # Анимацию не перекодируем, EXIF в GIF не бывает.
+            upload.seek(0)
+            return upload
+        image = _shrink(image, settings.POST_IMAGE_MAX_SIDE)
+        # Поворот из EXIF применяется к пикселям, раз EXIF не сохранится.
+        image = ImageOps.exif_transpose(image)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        name = os.path.basename(upload.name)
+        if image_format not in Image.SAVE:
+            image_format = FALLBACK_FORMAT
+            name = os.path.splitext(name)[0] + '.png'
+            if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                image = image.convert('RGBA')
+        output = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        image.save(output, image_format, **SAVE_OPTIONS.get(image_format, {}))
+    output.seek(0)
+    return File(output, name=name)
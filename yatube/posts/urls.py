@@ -13,6 +13,8 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     # Просмотр записи.
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    # Поиск по текстам постов.
+    path('search/', views.search, name='search'),
     # Создание записи.
     path('create/', views.post_create, name='post_create'),
     # Редактирование записи.
@@ -1,14 +1,22 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from . import batching, caching
 from .addons import paginator
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .search import SearchPaginator
+from .timeline import timeline_posts
 
 # Numbers of title length
 TITLE_LENGTH: int = 30
 
 
+@condition(etag_func=caching.index_etag)
 def index(request):
     template = 'posts/index.html'
     title = "Последние обновления на сайте"
@@ -17,10 +25,12 @@ def index(request):
     context = {
         'title': title,
         'page_obj': page_obj,
+        **caching.feed_context(request, caching.ALL_POSTS),
     }
     return render(request, template, context)
 
 
+@condition(etag_func=caching.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
@@ -29,25 +39,31 @@ def group_posts(request, slug):
     context = {
         'group': group,
         'page_obj': page_obj,
+        **caching.feed_context(request, caching.group_scope(group.pk)),
     }
     return render(request, template, context)
 
 
+@condition(etag_func=caching.profile_etag)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    title = f'Профайл пользователя { author.get_full_name() }'
+    authors = User.objects.select_related('stats')
+    if request.user.is_authenticated:
+        # Подписка приходит подзапросом вместе с автором.
+        authors = authors.annotate(is_followed=Exists(
+            Follow.objects.filter(user=request.user, author=OuterRef('pk'))
+        ))
     posts = Post.objects.select_related(
                 'author', 'group'
-            ).filter(author=author)
-    count = posts.count()
-    page_obj = paginator(request, posts)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-                user=request.user, author=author
-            ).exists()
-    else:
-        following = False
+            ).filter(author__username=username)
+    # Автор и страница постов не зависят друг от друга.
+    author, page_obj = batching.run(
+        lambda: get_object_or_404(authors, username=username),
+        lambda: paginator(request, posts),
+    )
+    title = f'Профайл пользователя { author.get_full_name() }'
+    count = UserStats.for_user(author).post_count
+    following = getattr(author, 'is_followed', False)
     if request.user == author:
         user_not_author = True
     else:
@@ -56,20 +72,30 @@ def profile(request, username):
         'author': author,
         'title': title,
         'page_obj': page_obj,
-        'count': count,    
+        'count': count,
         'following': following,
         'user_not_author': user_not_author,
+        **caching.feed_context(request, caching.author_scope(author.pk)),
     }
     return render(request, template, context)
 
 
+@condition(etag_func=caching.post_etag)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = Post.objects.get(pk=post_id)
+    # Пост и комментарии к нему не зависят друг от друга.
+    post, comments = batching.run(
+        lambda: get_object_or_404(
+            Post.objects.select_related('author__stats', 'group'),
+            pk=post_id,
+        ),
+        lambda: list(
+            Comment.objects.select_related('author').filter(post=post_id)
+        ),
+    )
     title = post.text[:TITLE_LENGTH]
-    count = Post.objects.filter(author=post.author).count()
+    count = UserStats.for_user(post.author).post_count
     form = CommentForm()
-    comments = Comment.objects.select_related('author').filter(post=post.id)
     context = {
         'post_id': post_id,
         'post': post,
@@ -81,7 +107,24 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(query, settings.POSTS_ON_PAGE).get_page(
+            request.GET.get('cursor')
+        )
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -93,6 +136,7 @@ def add_comment(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
     title = 'Добавить запись'
@@ -118,7 +162,8 @@ def post_create(request):
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     template = 'posts/create_post.html'
-    if post.author != request.user:
+    # Сравнение по id не загружает автора отдельным запросом.
+    if post.author_id != request.user.id:
         return redirect('posts:post_detail', post_id=post_id)
     title = 'Редактировать запись'
     is_edit = True
@@ -142,8 +187,8 @@ def post_edit(request, post_id):
 def follow_index(request):
     template = 'posts/follow.html'
     title = "Последние обновления авторов"
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, posts)
+    posts = timeline_posts(request.user)
+    page_obj = paginator(request, posts, key='feed_date')
     context = {
         'title': title,
         'page_obj': page_obj,
@@ -152,21 +197,22 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     # Подписаться на автора
     user = request.user
     author = get_object_or_404(User, username=username)
-    follower_count = Follow.objects.filter(user=user, author=author).count()
-    if user != author and follower_count == 0:
-        Follow.objects.create(user=user, author=author)
+    if user != author:
+        # Повторная подписка упирается в уникальный индекс,
+        # get_or_create обрабатывает такую гонку сам.
+        Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', username=author)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     # Отписаться от автора
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(user=request.user, author=author)
-    if follower.exists():
-        follower.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=author)
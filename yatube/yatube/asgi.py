@@ -0,0 +1,28 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with any ASGI server, for example:
+
+    uvicorn yatube.asgi:application --workers 4
+
+Django 2.2 has no ASGI handler, so the WSGI application runs in a thread
+pool behind core.asgi.WSGIToASGI; on Django 3.0+ the native handler is used.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+if django.VERSION >= (3, 0):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+else:
+    from django.core.wsgi import get_wsgi_application
+
+    from core.asgi import WSGIToASGI
+
+    application = WSGIToASGI(get_wsgi_application())
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -59,24 +60,42 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 # Путь к директории с шаблонами:
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Шаблоны, которые core.loaders.InliningLoader подставляет на место
+# {% include %} при загрузке: статья ленты включается на каждый пост.
+TEMPLATE_INLINE_INCLUDES = ('includes/article.html',)
+TEMPLATE_LOADERS = [
+    ('core.loaders.InliningLoader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ], TEMPLATE_INLINE_INCLUDES),
+]
+# Скомпилированные шаблоны хранятся в памяти процесса; при DEBUG
+# по умолчанию выключено, чтобы правки шаблонов были видны сразу.
+TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', '' if DEBUG else '1') == '1'
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -87,19 +106,124 @@ TEMPLATES = [
         },
     },
 ]
+# TEMPLATE_ENGINE=jinja2 (нужен пакет jinja2): base.html, includes
+# и ленты из папки jinja2 отрисовывает Jinja2 (core/jinja2.py),
+# остальные шаблоны - Django.
+TEMPLATE_ENGINE = os.getenv('TEMPLATE_ENGINE', 'django')
+if TEMPLATE_ENGINE == 'jinja2':
+    TEMPLATES.insert(0, {
+        'BACKEND': 'core.jinja2.Jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'jinja2')],
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+            'context_processors': TEMPLATES[0]['OPTIONS'][
+                'context_processors'
+            ],
+        },
+    })
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Потоки для представлений при запуске через yatube/asgi.py
+# (core/asgi.py): сколько запросов Django обрабатывает одновременно
+# в одном процессе, пока медленные клиенты ждут в цикле событий.
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# База выбирается переменной окружения DB_ENGINE: sqlite (по умолчанию)
+# или postgres (нужен psycopg2, параметры в DB_NAME, DB_USER и т.д.).
+# DB_PROFILE=production включает постоянные соединения с проверкой
+# перед запросом и настройки SQLite из SQLITE_PRODUCTION_PRAGMAS.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+DB_PROFILE = os.getenv('DB_PROFILE', 'development')
+PRODUCTION_DB = DB_PROFILE == 'production'
+
+DATABASE_BACKENDS = {
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME', 'yatube'),
+        'USER': os.getenv('DB_USER', 'yatube'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'OPTIONS': {'connect_timeout': 5},
+        # Пул соединений в Django 2.2 - внешний (PgBouncer). В режиме
+        # пула транзакций серверные курсоры .iterator() не работают.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER') == '1',
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        **DATABASE_BACKENDS[DB_ENGINE],
+        # Сколько секунд соединение живёт между запросами (0 - закрывается
+        # после каждого запроса).
+        'CONN_MAX_AGE': int(
+            os.getenv('DB_CONN_MAX_AGE', 60 if PRODUCTION_DB else 0)
+        ),
+    }
+}
+
+# Реплики только для чтения (core/routers.py): DB_REPLICAS - адреса
+# через запятую (HOST для PostgreSQL, файл для SQLite), DB_REPLICA_WEIGHTS -
+# веса в том же порядке. DATABASE_REPLICA_POLICY: round_robin - по кругу,
+# weighted - случайно по весам. После записи пользователь читает основную
+# базу REPLICA_PIN_SECONDS секунд, чтобы видеть свои изменения. Столько же
+# после сдвига поколения ленты (posts/caching.py) её страницы читают
+# основную базу у всех: реплика должна отставать меньше этого окна.
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICAS = {}
+_replica_key = 'HOST' if DB_ENGINE == 'postgres' else 'NAME'
+_replica_weights = [
+    int(weight or 1)
+    for weight in os.getenv('DB_REPLICA_WEIGHTS', '').split(',')
+]
+for _number, _address in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    _alias = f'replica{_number}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        _replica_key: _address,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS[_alias] = (
+        _replica_weights[_number] if _number < len(_replica_weights) else 1
+    )
+DATABASE_REPLICA_POLICY = os.getenv('DB_REPLICA_POLICY', 'round_robin')
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+# Проверять постоянные соединения в начале запроса (core/signals.py).
+DB_HEALTH_CHECKS = PRODUCTION_DB
+
+# Потоки для независимых запросов профиля и поста (posts/batching.py),
+# 0 - запросы по очереди. Имеет смысл с постоянными соединениями:
+# иначе каждый поток открывает соединение заново.
+QUERY_BATCH_WORKERS = int(
+    os.getenv('QUERY_BATCH_WORKERS', 4 if PRODUCTION_DB else 0)
+)
+
+# WAL: читатели не блокируют писателя и наоборот; synchronous=normal
+# в WAL не теряет целостность, только последние транзакции при сбое
+# питания; mmap и кэш страниц - в байтах и КБ (отрицательное значение);
+# busy_timeout - сколько миллисекунд ждать блокировку вместо ошибки
+# "database is locked".
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
 }
+SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS if PRODUCTION_DB else {}
 
 
 # Password validation
@@ -145,16 +269,146 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-#  подключаем движок filebased.EmailBackend
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+#  подключаем движок filebased.EmailBackend; с EMAIL_DELIVERY_BACKEND=
+# django.core.mail.backends.smtp.EmailBackend письма уходят на EMAIL_HOST
+EMAIL_DELIVERY_BACKEND = os.getenv(
+    'EMAIL_DELIVERY_BACKEND',
+    'django.core.mail.backends.filebased.EmailBackend',
+)
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS') == '1'
+EMAIL_TIMEOUT = 10
+
+# EMAIL_QUEUE=1: письма (сброс пароля и т.п.) только ставятся в очередь
+# в базе, запрос не ждёт почтовый сервер. Команда send_queued_mail
+# отправляет их через EMAIL_DELIVERY_BACKEND пачками по одному соединению,
+# не быстрее EMAIL_QUEUE_RATE писем в секунду (0 - без ограничения),
+# и повторяет неудачные до EMAIL_QUEUE_MAX_ATTEMPTS раз. С ограничением
+# скорости пачка не больше, чем уходит за срок аренды core.mail.LEASE_SECONDS.
+EMAIL_QUEUE = os.getenv('EMAIL_QUEUE') == '1'
+EMAIL_BACKEND = (
+    'core.mail.QueuedEmailBackend' if EMAIL_QUEUE else EMAIL_DELIVERY_BACKEND
+)
+EMAIL_QUEUE_BATCH_SIZE: int = 100
+EMAIL_QUEUE_MAX_ATTEMPTS: int = 5
+EMAIL_QUEUE_RATE = float(os.getenv('EMAIL_QUEUE_RATE', 0))
 
 # Numbers of posts shown on page
 POSTS_ON_PAGE: int = 10
 
-CACHES = {
-    'default': {
+# Режим пагинации лент: 'page' - номера страниц (COUNT + OFFSET),
+# 'cursor' - keyset-пагинация по (pub_date, id) без подсчёта записей.
+# Ссылка с параметром ?cursor= включает keyset-режим в любом случае.
+POSTS_PAGINATION = os.getenv('POSTS_PAGINATION', 'page')
+
+# Лента подписок: сколько последних постов хранится у каждого читателя
+# и начиная с какого числа подписчиков посты автора не раздаются
+# по лентам при публикации, а подмешиваются при чтении.
+# TIMELINE_PRUNE_SLACK - на какую долю лента может превысить
+# TIMELINE_LENGTH, прежде чем её обрежут обратно до TIMELINE_LENGTH.
+TIMELINE_LENGTH: int = 500
+TIMELINE_FANOUT_LIMIT: int = 10000
+TIMELINE_PRUNE_SLACK: float = 0.1
+
+# Миниатюры картинок постов строятся заранее в фоновом пуле потоков
+# (0 - сразу при сохранении поста), ленты выводят готовые файлы.
+POST_THUMBNAIL_SIZE = (960, 339)
+# Ширины вариантов WebP/AVIF для srcset, пропорции как у миниатюры.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_THUMBNAIL_WORKERS = int(os.getenv('POST_THUMBNAIL_WORKERS', 2))
+
+# Ограничения загружаемых картинок: размер файла и число точек
+# проверяются до декодирования, оригинал больше POST_IMAGE_MAX_SIDE
+# по длинной стороне уменьшается, EXIF при этом удаляется.
+# JPEG декодируется сразу уменьшенным, остальные форматы - целиком,
+# поэтому для них предел POST_IMAGE_MAX_DECODED_PIXELS (около 64 МБ
+# в RGBA).
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_DECODED_PIXELS = 16_000_000
+POST_IMAGE_MAX_SIDE = 2560
+
+# Замеры запросов (core/middleware.py), по умолчанию выключены:
+# заголовок Server-Timing, гистограммы по представлениям на /metrics
+# и профиль запроса с ?profile=1 в PROFILING_DIR. /metrics и профили
+# доступны персоналу и по заголовку Authorization: Bearer METRICS_TOKEN.
+PROFILING = os.getenv('PROFILING', '') == '1'
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'yatube_profiles')
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Бэкенд кэша выбирается переменной окружения CACHE_BACKEND:
+# locmem - свой кэш у каждого процесса (по умолчанию);
+# memcached - общий кэш через pymemcache с пулом соединений;
+# redis - общий кэш через django-redis с пулом соединений;
+# file - общий кэш в файлах для нескольких процессов на одном хосте.
+# CACHE_LOCATION задаёт адрес сервера (серверов через запятую) или папку.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+CACHE_POOL_SIZE = int(os.getenv('CACHE_POOL_SIZE', 16))
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'memcached': {
+        'BACKEND': 'core.cache.PyMemcacheCache',
+        'LOCATION': CACHE_LOCATION or '127.0.0.1:11211',
+        'OPTIONS': {'max_pool_size': CACHE_POOL_SIZE},
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'CONNECTION_POOL_KWARGS': {'max_connections': CACHE_POOL_SIZE},
+        },
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or os.path.join(
+            tempfile.gettempdir(), 'yatube_cache'
+        ),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+
+# Общий ли кэш у всех процессов сайта. Счётчики поколений лент
+# (posts/caching.py) лежат в кэше: в locmem запись сдвигает поколение
+# только в том процессе, который её обработал. CACHE_SHARED=1 при locmem
+# допустимо, только если сайт работает в одном процессе.
+CACHE_SHARED = os.getenv(
+    'CACHE_SHARED', '' if CACHE_BACKEND == 'locmem' else '1'
+) == '1'
+
+# Время жизни закэшированных фрагментов лент, секунды. Устаревшие
+# фрагменты отсекаются счётчиками поколений из posts/caching.py;
+# без общего кэша фрагменты живут не дольше прежних 20 секунд.
+FEED_CACHE_TIMEOUT: int = 60 * 15 if CACHE_SHARED else 20
+
+# Хранение сессий выбирается переменной окружения SESSION_MODE:
+# db - таблица django_session (по умолчанию);
+# cached_db - кэш CACHES['default'] с записью в базу, чтение из базы
+# только при промахе; нужен общий кэш memcached, redis или file: в locmem
+# выход в одном процессе не сбрасывает сессию в кэше других процессов,
+# и сайт с ним не запускается (core.sessions.check_session_cache);
+# signed_cookies - данные сессии в подписанной SECRET_KEY куке,
+# без запросов к базе. Куку видит браузер, а выход сбрасывает её только
+# в этом браузере, поэтому в сессии не должно быть секретов.
+# Просроченные сессии в базе удаляет команда clear_expired_sessions.
+SESSION_MODE = os.getenv('SESSION_MODE', 'db')
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+SESSION_CLEANUP_BATCH_SIZE: int = 1000